@@ -1,5 +1,7 @@
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
@@ -12,9 +14,19 @@ except ImportError:
     except ImportError:
         st.error("❌ Erreur : Package Google Sheets non trouvé. Installez avec : pip install streamlit-gsheets")
         st.stop()
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import rowcol_to_a1
+from gspread_dataframe import get_as_dataframe
 from PIL import Image
-import pytesseract
-import re
+import uuid
+import importlib.util
+from pathlib import Path
+from ledger import ConflitEcriture, LocalLedger, StructureFeuille, SyncWorker, meme_valeur, revision
+from doublons import IndexDoublons, en_centimes
+from ocr import TravauxOCR
+from rapport import TravauxRapports
+from remboursements import ORDRES_FIFO, allouer_remboursement_fifo
+from import_whatnot import lire_export_whatnot
 
 # --- CONFIGURATION ---
 st.set_page_config(
@@ -62,9 +74,9 @@ col_title, col_refresh = st.columns([6, 1])
 with col_title:
     st.title("💎 MJTGC - Whatnot Tracker Pro V2")
 with col_refresh:
-    if st.button("🔄", help="Rafraîchir les données", use_container_width=True):
-        st.cache_data.clear()
-        st.rerun()
+    refresh_clicked = st.button("🔄", help="Rafraîchir les données", use_container_width=True)
+
+LEDGER_PATH = Path(__file__).with_name('whatnot_ledger.sqlite')
 
 # --- CONNEXION GOOGLE SHEETS ---
 try:
@@ -73,121 +85,446 @@ except Exception as e:
     st.error(f"❌ Erreur de connexion Google Sheets : {e}")
     st.stop()
 
-# --- FONCTION OCR AMÉLIORÉE ---
-def extract_ticket_data(image):
-    """Extraction intelligente des données d'un ticket de caisse"""
-    try:
-        text = pytesseract.image_to_string(image, lang='fra')
-        
-        # Extraction du prix (dernier montant trouvé = souvent le total)
-        prices = re.findall(r"(\d+[,\.]\d{2})", text)
-        price = float(prices[-1].replace(',', '.')) if prices else 0.0
-        
-        # Extraction de la date
-        date_patterns = [
-            r"(\d{2}[/\-\.]\d{2}[/\-\.]\d{4})",  # JJ/MM/AAAA
-            r"(\d{2}[/\-\.]\d{2}[/\-\.]\d{2})"    # JJ/MM/AA
-        ]
-        date_found = datetime.now()
-        for pattern in date_patterns:
-            dates = re.findall(pattern, text)
-            if dates:
-                try:
-                    date_found = pd.to_datetime(dates[0], dayfirst=True)
-                    break
-                except:
-                    continue
+# --- SCHÉMA ET MIGRATIONS ---
+SCHEMA_VERSION = 3
+META_WORKSHEET = '_meta'
+
+COLONNES = [
+    'Date', 'Type', 'Description', 'Montant_Gain', 'Montant_Depense',
+    'Live_ID', 'Montant_Rembourse_Julie', 'Statut_Remb_Julie',
+    'Date_Remb_Complete_Julie', 'Année', 'Notes', 'ID_Operation', 'Revision'
+]
+
+def detecter_version_schema(data):
+    """Version du schéma déduite des colonnes, pour les feuilles sans version enregistrée"""
+    if 'Montant' in data.columns and 'Montant_Gain' not in data.columns:
+        return 1
+    return SCHEMA_VERSION
+
+def migrer_schema(data, version):
+    """Migration vectorisée des données brutes de la feuille vers SCHEMA_VERSION
+
+    Retourne (données, True si la structure a changé et doit être réécrite).
+    """
+    data = data.copy()
+    colonnes_initiales = list(data.columns)
+    
+    # MIGRATION V1 → V2 : un seul montant signé devient gain / dépense
+    if version < 2:
+        montant = pd.to_numeric(data['Montant'], errors='coerce').fillna(0)
+        data['Montant'] = montant
+        data['Montant_Gain'] = np.where(montant > 0, montant, 0)
+        data['Montant_Depense'] = np.where(montant < 0, -montant, 0)
         
-        # Extraction du nom du magasin (première ligne non vide)
-        lines = [l.strip() for l in text.split('\n') if l.strip() and len(l.strip()) > 3]
-        store_name = lines[0][:40] if lines else "Ticket scanné"
+        if 'Statut_Julie' in data.columns:
+            data['Statut_Remb_Julie'] = data['Statut_Julie']
+        if 'Date_Remb_Julie' in data.columns:
+            data['Date_Remb_Complete_Julie'] = data['Date_Remb_Julie']
         
-        return date_found, store_name, price
-    except Exception as e:
-        st.error(f"Erreur OCR : {e}")
-        return datetime.now(), "Ticket scanné", 0.0
+        paye = data['Statut_Remb_Julie'] == 'Payé' if 'Statut_Remb_Julie' in data.columns else False
+        data['Montant_Rembourse_Julie'] = np.where(
+            (data['Montant_Gain'] > 0) & paye, data['Montant_Gain'] / 2, 0
+        )
+    
+    # Colonnes ajoutées au fil des versions
+    if 'Type' not in data.columns:
+        gain = pd.to_numeric(data['Montant_Gain'], errors='coerce').fillna(0)
+        data['Type'] = np.where(gain > 0, TYPES_OPERATION[0], TYPES_OPERATION[2])
+    if 'Live_ID' not in data.columns:
+        data['Live_ID'] = None
+    if 'Statut_Remb_Julie' not in data.columns:
+        gain = pd.to_numeric(data['Montant_Gain'], errors='coerce').fillna(0)
+        data['Statut_Remb_Julie'] = np.where(gain > 0, 'En attente', 'N/A')
+    if 'Date_Remb_Complete_Julie' not in data.columns:
+        data['Date_Remb_Complete_Julie'] = None
+    if 'Année' not in data.columns:
+        data['Année'] = pd.to_datetime(data['Date'], errors='coerce').dt.year.astype(str)
+    if 'Notes' not in data.columns:
+        data['Notes'] = ''
+    # V3 : révision par ligne pour le contrôle optimiste des écritures concurrentes
+    if 'Revision' not in data.columns:
+        data['Revision'] = 0
+    
+    # L'ordre des colonnes n'impose pas de réécriture (ajouts et modifications suivent l'en-tête)
+    return data, version < SCHEMA_VERSION or bool(set(data.columns) - set(colonnes_initiales))
+
+# Format mémoire : montants en centimes (int64), colonnes répétitives en catégories
+COLONNES_MONTANTS = ['Montant_Gain', 'Montant_Depense', 'Montant_Rembourse_Julie']
+COLONNES_CATEGORIES = ['Type', 'Live_ID', 'Statut_Remb_Julie', 'Année']
+# Une seule résolution : une colonne entièrement vide serait lue en datetime64[s] et refuserait datetime.now()
+COLONNES_DATES = ['Date', 'Date_Remb_Complete_Julie']
+
+def typer_categories(data):
+    """Convertit les colonnes répétitives en catégories de texte"""
+    for col in COLONNES_CATEGORIES:
+        if col in data.columns:
+            # Le registre rend l'Année en entier, les ajouts l'écrivent en texte : une seule catégorie '2026'
+            valeurs = data[col]
+            data[col] = valeurs.where(valeurs.isna(), valeurs.astype(str)).astype('category')
+    return data
+
+def typer_dates(data):
+    """Dates en datetime64[us]"""
+    for col in COLONNES_DATES:
+        if col in data.columns:
+            data[col] = pd.to_datetime(data[col], errors='coerce').astype('datetime64[us]')
+    return data
+
+def typer_colonnes(data):
+    """Format feuille (euros) → format mémoire (centimes entiers, dates, catégories)"""
+    for col in COLONNES_MONTANTS:
+        euros = pd.to_numeric(data[col], errors='coerce').fillna(0)
+        data[col] = (euros * 100).round().astype('int64')
+    return typer_categories(typer_dates(data))
+
+def colonnes_en_euros(data):
+    """Copie de data avec les montants en euros (affichage, exports, écriture vers la feuille)"""
+    return data.assign(**{col: data[col] / 100 for col in COLONNES_MONTANTS if col in data.columns})
+
+# --- ACCÈS GOOGLE SHEETS ---
+def format_for_sheet(dataframe):
+    """Convertit un DataFrame au format texte attendu par la feuille"""
+    # Les colonnes internes (préfixe _) restent en mémoire
+    df_save = dataframe.drop(columns=[col for col in dataframe.columns if col.startswith('_')])
+    for col in ['Date', 'Date_Remb_Complete_Julie']:
+        if col in df_save.columns:
+            df_save[col] = pd.to_datetime(df_save[col], errors='coerce').dt.strftime('%Y-%m-%d')
+    return df_save
+
+def format_cell_value(value):
+    """Convertit une valeur de cellule au format attendu par la feuille"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ''
+    if isinstance(value, (datetime, pd.Timestamp)):
+        return value.strftime('%Y-%m-%d')
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+def get_worksheet():
+    """Retourne la feuille gspread configurée pour la connexion"""
+    return conn.client._select_worksheet()
+
+def read_sheet():
+    """Lit la feuille au format brut et complète les ID manquants (lève une exception en cas d'échec)
+
+    Retourne (données, besoin de réécrire la feuille : nouveaux ID, migration ou en-tête incomplet).
+    """
+    worksheet = get_worksheet()
+    data = get_as_dataframe(worksheet, evaluate_formulas=True)
+    # Seules les colonnes sans en-tête sont retirées : une colonne nommée mais vide (Notes...) reste
+    data = data.dropna(how='all')
+    data = data.loc[:, [not str(col).startswith('Unnamed') for col in data.columns]]
+    
+    if data.empty:
+        # Feuille vierge ou en-tête sans toutes les colonnes : la réécriture pose l'en-tête complet
+        return pd.DataFrame(columns=COLONNES), not set(COLONNES) <= set(data.columns)
+    
+    # Migration exécutée une seule fois : la feuille réécrite porte ensuite la nouvelle version
+    version = read_schema_version(worksheet.spreadsheet) or detecter_version_schema(data)
+    data, migrated = migrer_schema(data, version)
+    
+    if 'ID_Operation' not in data.columns:
+        data['ID_Operation'] = None
+    
+    # Identifiant stable par opération (les lignes sans ID sont persistées par une réécriture)
+    ids_manquants = data['ID_Operation'].isna() | (data['ID_Operation'].astype(str).str.strip() == '')
+    if ids_manquants.any():
+        data.loc[ids_manquants, 'ID_Operation'] = [nouvel_id_operation() for _ in range(ids_manquants.sum())]
+    
+    return data.reset_index(drop=True), migrated or bool(ids_manquants.any())
+
+def sheet_append_rows(new_rows):
+    """Ajoute uniquement les nouvelles lignes à la fin de la feuille (lève une exception en cas d'échec)"""
+    worksheet = get_worksheet()
+    header = worksheet.row_values(1)
+    df_rows = format_for_sheet(new_rows)
+
+    # En-tête vide ou incomplet : la feuille sera réécrite
+    missing = [col for col in df_rows.columns if col not in header]
+    if not header or missing:
+        raise StructureFeuille(f"Colonnes absentes de la feuille : {missing}")
+
+    # Lignes déjà présentes (envoi interrompu avant son acquittement) : pas de doublon
+    if 'ID_Operation' in header and 'ID_Operation' in df_rows.columns:
+        ids_feuille = set(worksheet.col_values(header.index('ID_Operation') + 1)[1:])
+        df_rows = df_rows[~df_rows['ID_Operation'].isin(ids_feuille)]
+        if df_rows.empty:
+            return
+
+    df_rows = df_rows.reindex(columns=header).astype(object)
+    values = df_rows.where(df_rows.notna(), '').values.tolist()
+    worksheet.append_rows(values, value_input_option='USER_ENTERED')
+
+def sheet_patch_rows(updates, revisions=None, attendues=None):
+    """Écrit uniquement les cellules modifiées, par ID d'opération (lève une exception en cas d'échec)
+
+    revisions = {ID_Operation: révision attendue dans la feuille} : une ligne modifiée entre-temps
+    par un autre appareil n'est écrite que si ses cellules visées ont encore les valeurs attendues
+    ({ID_Operation: {colonne: valeur}}) ; les autres et les lignes supprimées lèvent ConflitEcriture.
+    """
+    worksheet = get_worksheet()
+    header = worksheet.row_values(1)
+    absentes = {'ID_Operation', *(col for changes in updates.values() for col in changes)} - set(header)
+    if absentes:
+        raise StructureFeuille(f"Colonnes absentes de la feuille : {', '.join(sorted(absentes))}")
+    
+    ids = worksheet.col_values(header.index('ID_Operation') + 1)
+    row_numbers = {op_id: i + 1 for i, op_id in enumerate(ids) if i > 0}
+    
+    revisions_feuille = {}
+    if revisions and 'Revision' in header:
+        valeurs = worksheet.col_values(header.index('Revision') + 1)
+        revisions_feuille = {
+            op_id: revision(valeurs[ligne - 1]) if ligne <= len(valeurs) else 0
+            for op_id, ligne in row_numbers.items()
+        }
+    
+    conflits, fusions = [], {}
+    for op_id, changes in updates.items():
+        if op_id not in row_numbers:
+            conflits.append(op_id)
+            continue
+        attendue = revisions.get(op_id) if revisions else None
+        if op_id not in revisions_feuille or attendue is None or revisions_feuille[op_id] == attendue:
+            continue
+        # Ligne modifiée par un autre appareil : fusion si les cellules visées n'ont pas bougé
+        avant = (attendues or {}).get(op_id, {})
+        ligne = worksheet.row_values(row_numbers[op_id])
+        cellules = {
+            col: ligne[header.index(col)] if header.index(col) < len(ligne) else ''
+            for col in changes if col != 'Revision'
+        }
+        if all(col in avant and meme_valeur(valeur, avant[col]) for col, valeur in cellules.items()):
+            fusions[op_id] = revisions_feuille[op_id] + 1
+        else:
+            conflits.append(op_id)
+    
+    cells = []
+    for op_id, changes in updates.items():
+        if op_id in conflits:
+            continue
+        if op_id in fusions:
+            changes = {**changes, 'Revision': fusions[op_id]}
+        for col, value in changes.items():
+            cells.append({
+                'range': rowcol_to_a1(row_numbers[op_id], header.index(col) + 1),
+                'values': [[format_cell_value(value)]]
+            })
+    
+    if cells:
+        worksheet.batch_update(cells, value_input_option='USER_ENTERED')
+    if conflits:
+        raise ConflitEcriture(conflits)
+
+def sheet_delete_rows(ids):
+    """Supprime les lignes des opérations par ID, par plages contiguës en partant du bas (lève une exception en cas d'échec)"""
+    worksheet = get_worksheet()
+    header = worksheet.row_values(1)
+    if 'ID_Operation' not in header:
+        raise StructureFeuille("Colonne ID_Operation absente de la feuille")
+    
+    # Les opérations déjà supprimées par un autre appareil sont ignorées
+    ids = set(ids)
+    lignes = [i + 1 for i, op_id in enumerate(worksheet.col_values(header.index('ID_Operation') + 1)) if i > 0 and op_id in ids]
+    plages = []
+    for ligne in lignes:
+        if plages and plages[-1][1] == ligne - 1:
+            plages[-1][1] = ligne
+        else:
+            plages.append([ligne, ligne])
+    for debut, fin in reversed(plages):
+        worksheet.delete_rows(debut, fin)
+
+def sheet_revision():
+    """Jeton de fraîcheur peu coûteux : date de dernière modification du classeur (API Drive)"""
+    try:
+        return get_worksheet().spreadsheet.get_lastUpdateTime()
+    except Exception:
+        # Sans accès à l'API Drive, la feuille est relue à chaque cycle
+        return None
+
+def read_schema_version(spreadsheet):
+    """Version de schéma enregistrée dans l'onglet _meta (None si absente)"""
+    try:
+        values = spreadsheet.worksheet(META_WORKSHEET).get_all_values()
+    except WorksheetNotFound:
+        return None
+    meta = {row[0]: row[1] for row in values if len(row) >= 2}
+    return int(meta['schema_version']) if meta.get('schema_version', '').isdigit() else None
+
+def write_schema_version(spreadsheet):
+    """Enregistre SCHEMA_VERSION dans l'onglet _meta"""
+    try:
+        meta = spreadsheet.worksheet(META_WORKSHEET)
+    except WorksheetNotFound:
+        meta = spreadsheet.add_worksheet(title=META_WORKSHEET, rows=10, cols=2)
+    meta.update('A1:B1', [['schema_version', SCHEMA_VERSION]])
+
+def sheet_rewrite(dataframe):
+    """Réécrit toute la feuille au schéma courant (lève une exception en cas d'échec)"""
+    conn.update(data=format_for_sheet(dataframe))
+    write_schema_version(get_worksheet().spreadsheet)
+
+# --- REGISTRE LOCAL ---
+@st.cache_resource
+def get_ledger():
+    """Registre SQLite partagé par toutes les sessions, synchronisé en arrière-plan avec la feuille"""
+    ledger = LocalLedger(LEDGER_PATH)
+    sync_worker = SyncWorker(
+        ledger, sheet_append_rows, sheet_patch_rows, sheet_delete_rows, sheet_rewrite, read_sheet,
+        probe=sheet_revision
+    )
+    sync_worker.start()
+    return ledger, sync_worker
+
+ledger, sync_worker = get_ledger()
+
+# Rafraîchissement : relecture forcée de la feuille, les caches suivent la nouvelle version du registre
+if refresh_clicked:
+    with st.spinner("Synchronisation avec Google Sheets..."):
+        if not sync_worker.refresh():
+            st.toast("⏳ Synchronisation toujours en cours, les données seront mises à jour au prochain affichage")
 
 # --- CHARGEMENT DES DONNÉES ---
-@st.cache_data(ttl=10)
-def load_data():
-    """Charge et prépare les données depuis Google Sheets"""
+def nouvel_id_operation():
+    """Génère un identifiant d'opération persistant"""
+    return f"op_{uuid.uuid4().hex[:12]}"
+
+TYPES_OPERATION = ["💰 Gain Live", "🛒 Dépense Stock Live", "💸 Frais Divers"]
+
+def creer_operation(date_op, type_op, description, montant, live_id=None, notes=''):
+    """Construit une ligne du registre à partir d'une saisie (formulaire, ticket scanné...)"""
+    # Génération auto du Live ID si nécessaire
+    if "Live" in type_op and not live_id:
+        live_id = f"LIVE_{date_op.strftime('%Y%m%d_%H%M%S')}"
+    
+    # Type de montant (en centimes)
+    montant_gain = en_centimes(montant) if "Gain" in type_op else 0
+    montant_depense = en_centimes(montant) if "Dépense" in type_op or "Frais" in type_op else 0
+    
+    return {
+        "Date": pd.to_datetime(date_op),
+        "Type": type_op,
+        "Description": description,
+        "Montant_Gain": montant_gain,
+        "Montant_Depense": montant_depense,
+        "Live_ID": live_id,
+        "Montant_Rembourse_Julie": 0,
+        "Statut_Remb_Julie": "En attente" if montant_gain > 0 else "N/A",
+        "Date_Remb_Complete_Julie": None,
+        "Année": str(date_op.year),
+        "Notes": notes,
+        "ID_Operation": nouvel_id_operation(),
+        "Revision": 0
+    }
+
+# Colonnes internes de période, calculées au chargement : {niveau: (colonne, fréquence)}
+COLONNES_PERIODES = {'Mois': ('_Mois', 'M'), 'Trimestre': ('_Trimestre', 'Q'), 'Année': ('_Annee', 'Y')}
+
+def ajouter_periodes(data):
+    """Ajoute les colonnes de période catégorielles utilisées par les filtres"""
+    for col, freq in COLONNES_PERIODES.values():
+        data[col] = data['Date'].dt.to_period(freq).astype(str).astype('category')
+    return data
+
+def preparer_donnees(data):
+    """Format feuille → format mémoire (dates, centimes, catégories, périodes), même sans aucune ligne"""
+    data = typer_colonnes(data)
+    data['ID_Operation'] = data['ID_Operation'].astype(str)
+    data['Revision'] = pd.to_numeric(data['Revision'], errors='coerce').fillna(0).astype('int64')
+    return ajouter_periodes(data)
+
+@st.cache_data(max_entries=4)
+def load_data(version):
+    """Charge et prépare les données depuis le registre local (version = version du registre)"""
     try:
-        data = conn.read(ttl="0s")
+        data = ledger.read_frame()
         
         if data is None or data.empty:
-            return pd.DataFrame(columns=[
-                'Date', 'Type', 'Description', 'Montant_Gain', 'Montant_Depense',
-                'Live_ID', 'Montant_Rembourse_Julie', 'Statut_Remb_Julie',
-                'Date_Remb_Complete_Julie', 'Année', 'Notes'
-            ])
-        
-        data = data.dropna(how='all')
-        data['Date'] = pd.to_datetime(data['Date'], errors='coerce')
-        
-        # MIGRATION AUTOMATIQUE V1 → V2
-        if 'Montant' in data.columns and 'Montant_Gain' not in data.columns:
-            st.info("🔄 Migration automatique des données V1 → V2 en cours...")
-            
-            data['Montant'] = pd.to_numeric(data['Montant'], errors='coerce').fillna(0)
-            data['Montant_Gain'] = data['Montant'].apply(lambda x: x if x > 0 else 0)
-            data['Montant_Depense'] = data['Montant'].apply(lambda x: abs(x) if x < 0 else 0)
-            
-            if 'Statut_Julie' in data.columns:
-                data['Statut_Remb_Julie'] = data['Statut_Julie']
-            if 'Date_Remb_Julie' in data.columns:
-                data['Date_Remb_Complete_Julie'] = data['Date_Remb_Julie']
-            
-            def calc_remb_julie(row):
-                if row['Montant_Gain'] > 0:
-                    if 'Statut_Remb_Julie' in row and row['Statut_Remb_Julie'] == 'Payé':
-                        return row['Montant_Gain'] / 2
-                return 0
-            
-            data['Montant_Rembourse_Julie'] = data.apply(calc_remb_julie, axis=1)
-            st.success("✅ Migration terminée !")
-        else:
-            data['Montant_Gain'] = pd.to_numeric(data['Montant_Gain'], errors='coerce').fillna(0)
-            data['Montant_Depense'] = pd.to_numeric(data['Montant_Depense'], errors='coerce').fillna(0)
-            data['Montant_Rembourse_Julie'] = pd.to_numeric(data['Montant_Rembourse_Julie'], errors='coerce').fillna(0)
+            return preparer_donnees(pd.DataFrame(columns=COLONNES))
         
-        if 'Live_ID' not in data.columns:
-            data['Live_ID'] = None
-        if 'Statut_Remb_Julie' not in data.columns:
-            data['Statut_Remb_Julie'] = data.apply(
-                lambda row: 'En attente' if row['Montant_Gain'] > 0 else 'N/A', axis=1
-            )
-        if 'Date_Remb_Complete_Julie' not in data.columns:
-            data['Date_Remb_Complete_Julie'] = None
-        if 'Année' not in data.columns:
-            data['Année'] = data['Date'].dt.year.astype(str)
-        if 'Notes' not in data.columns:
-            data['Notes'] = ''
-        
-        data['Date_Remb_Complete_Julie'] = pd.to_datetime(data['Date_Remb_Complete_Julie'], errors='coerce')
-        
-        return data
+        # Registre alimenté avant l'enregistrement de la version de schéma
+        data, _ = migrer_schema(data.dropna(how='all'), detecter_version_schema(data))
+        return preparer_donnees(data)
     
     except Exception as e:
         st.error(f"❌ Erreur lors du chargement : {e}")
-        return pd.DataFrame()
+        return preparer_donnees(pd.DataFrame(columns=COLONNES))
 
 # --- SAUVEGARDE DES DONNÉES ---
-def save_data(dataframe):
-    """Sauvegarde les données vers Google Sheets"""
+def append_data(new_rows):
+    """Ajoute seulement les nouvelles lignes (envoyées à la feuille en arrière-plan)"""
     try:
-        df_save = dataframe.copy()
-        df_save['Date'] = pd.to_datetime(df_save['Date']).dt.strftime('%Y-%m-%d')
-        df_save['Date_Remb_Complete_Julie'] = pd.to_datetime(df_save['Date_Remb_Complete_Julie'], errors='coerce').dt.strftime('%Y-%m-%d')
-        
-        conn.update(data=df_save)
+        ledger.append(format_for_sheet(colonnes_en_euros(new_rows)))
+        sync_worker.notify()
         return True
     except Exception as e:
         st.error(f"❌ Erreur de sauvegarde : {e}")
         return False
 
+def valeurs_feuille(updates):
+    """{ID_Operation: {colonne: valeur}} du format mémoire vers le format de la feuille"""
+    return {
+        op_id: {
+            col: format_cell_value(value / 100 if col in COLONNES_MONTANTS else value)
+            for col, value in changes.items()
+        }
+        for op_id, changes in updates.items()
+    }
+
+def patch_data(updates, attendues=None):
+    """Modifie seulement les cellules {ID_Operation: {colonne: valeur}} (envoyées à la feuille en arrière-plan)
+
+    attendues = valeurs lues par la session (dont Revision) : refus si une autre session les a modifiées.
+    Retourne les nouvelles révisions {ID_Operation: révision}, None en cas d'échec.
+    """
+    try:
+        revisions = ledger.patch(valeurs_feuille(updates), valeurs_feuille(attendues) if attendues else None)
+        sync_worker.notify()
+        return revisions
+    except ConflitEcriture as e:
+        # Données de la session périmées : rechargées à la prochaine exécution
+        st.session_state.data_version = None
+        st.session_state.conflit_ecriture = f"⚠️ {e} sur un autre appareil : données rechargées, vérifiez avant de recommencer"
+    except Exception as e:
+        st.error(f"❌ Erreur de sauvegarde : {e}")
+    return None
+
+def delete_data(ids):
+    """Supprime les opérations par ID (supprimées de la feuille en arrière-plan, sans réécriture complète)"""
+    try:
+        ledger.delete(ids)
+        sync_worker.notify()
+        return True
+    except Exception as e:
+        st.error(f"❌ Erreur de sauvegarde : {e}")
+        return False
+
+def appliquer_patch(dataframe, updates):
+    """Applique en mémoire les modifications {ID_Operation: {colonne: valeur}}"""
+    for op_id, changes in updates.items():
+        mask = dataframe['ID_Operation'] == op_id
+        for col, value in changes.items():
+            colonne = dataframe[col]
+            if isinstance(colonne.dtype, pd.CategoricalDtype) and pd.notna(value) and value not in colonne.cat.categories:
+                dataframe[col] = colonne.cat.add_categories([value])
+            dataframe.loc[mask, col] = value
+
 # --- INITIALISATION SESSION STATE ---
-if 'data' not in st.session_state:
-    st.session_state.data = load_data()
+# Premier lancement : le registre local est alimenté depuis Google Sheets
+if not ledger.is_initialized():
+    try:
+        remote, needs_rewrite = read_sheet()
+        ledger.replace_from_remote(remote, ledger.version, needs_rewrite)
+        sync_worker.notify()
+    except Exception as e:
+        st.error(f"❌ Erreur lors du chargement : {e}")
+
+# Les données de la session sont rechargées dès que le registre local change de version
+if 'data' not in st.session_state or st.session_state.get('data_version') != ledger.version:
+    st.session_state.data = load_data(ledger.version)
+    st.session_state.data_version = ledger.version
 
 if 'delete_mode' not in st.session_state:
     st.session_state.delete_mode = False
@@ -195,39 +532,16 @@ if 'delete_mode' not in st.session_state:
 if 'rows_to_delete' not in st.session_state:
     st.session_state.rows_to_delete = []
 
-if 'migration_done' not in st.session_state:
-    st.session_state.migration_done = False
-
 df = st.session_state.data
 
-# Si migration détectée et pas encore sauvegardée
-if not df.empty and not st.session_state.migration_done:
-    if 'Montant_Gain' in df.columns and df['Live_ID'].isna().all():
-        with st.sidebar:
-            st.warning("⚠️ Migration V1→V2 détectée")
-            if st.button("💾 Sauvegarder les données migrées", use_container_width=True):
-                if save_data(df):
-                    st.success("✅ Données migrées sauvegardées !")
-                    st.session_state.migration_done = True
-                    st.balloons()
-                    st.rerun()
-
 # --- CALCULS FINANCIERS ---
-def calculer_metriques(df):
-    """Calcule toutes les métriques financières - LOGIQUE ORIGINALE"""
-    if df.empty:
-        return {
-            'ca_brut': 0, 'total_depenses_live': 0, 'benefice_net': 0,
-            'part_julie': 0, 'part_matheo': 0, 'impots': 0,
-            'julie_a_recevoir': 0, 'julie_recue': 0, 'julie_restant': 0,
-            'matheo_disponible': 0
-        }
-    
+def metriques_depuis_totaux(totaux):
+    """Métriques financières (en euros) à partir des sommes en centimes Montant_Gain / Montant_Depense / Montant_Rembourse_Julie"""
     # Chiffre d'affaires brut (uniquement les gains)
-    ca_brut = df['Montant_Gain'].sum()
+    ca_brut = totaux['Montant_Gain']
     
     # Total des dépenses de live
-    total_depenses_live = df['Montant_Depense'].sum()
+    total_depenses_live = totaux['Montant_Depense']
     
     # Bénéfice net = CA brut - dépenses
     benefice_net = ca_brut - total_depenses_live
@@ -240,109 +554,609 @@ def calculer_metriques(df):
     impots = ca_brut * 0.23
     
     # Remboursements Julie
-    julie_recue = df['Montant_Rembourse_Julie'].sum()
+    julie_recue = totaux['Montant_Rembourse_Julie']
     julie_restant = part_julie - julie_recue
     
     # Mathéo : récupère sa part uniquement après avoir remboursé Julie
     matheo_disponible = julie_recue  # Il récupère au fur et à mesure qu'il rembourse Julie
     
+    # Calculs en centimes, conversion en euros une seule fois à la fin
     return {
-        'ca_brut': ca_brut,
-        'total_depenses_live': total_depenses_live,
-        'benefice_net': benefice_net,
-        'part_julie': part_julie,
-        'part_matheo': part_matheo,
-        'impots': impots,
-        'julie_a_recevoir': part_julie,
-        'julie_recue': julie_recue,
-        'julie_restant': julie_restant,
-        'matheo_disponible': matheo_disponible
+        'ca_brut': ca_brut / 100,
+        'total_depenses_live': total_depenses_live / 100,
+        'benefice_net': benefice_net / 100,
+        'part_julie': part_julie / 100,
+        'part_matheo': part_matheo / 100,
+        'impots': impots / 100,
+        'julie_a_recevoir': part_julie / 100,
+        'julie_recue': julie_recue / 100,
+        'julie_restant': julie_restant / 100,
+        'matheo_disponible': matheo_disponible / 100
     }
 
-# --- CALCUL DES MÉTRIQUES PAR LIVE ---
-def calculer_metriques_live(df, live_id):
-    """Calcule les métriques d'un live spécifique"""
-    live_data = df[df['Live_ID'] == live_id]
-    
-    if live_data.empty:
-        return None
-    
-    gain_brut = live_data['Montant_Gain'].sum()
-    depense_stock = live_data['Montant_Depense'].sum()
-    benefice = gain_brut - depense_stock
-    
-    return {
-        'gain_brut': gain_brut,
-        'depense_stock': depense_stock,
-        'benefice': benefice,
-        'date': live_data['Date'].max()
+# --- CUBE D'AGRÉGATS (JOUR / MOIS / TRIMESTRE / ANNÉE) ---
+NIVEAUX_CUBE = {'Jour': 'D', 'Mois': 'M', 'Trimestre': 'Q', 'Année': 'Y'}
+COLONNES_CUBE = ['Montant_Gain', 'Montant_Depense', 'Montant_Rembourse_Julie', 'nb_gains', 'nb_depenses', 'nb_operations']
+
+def construire_cube(data):
+    """Sommes et nombres d'opérations par (niveau, période, type) ; niveau 'Tout' = tout l'historique"""
+    if data.empty:
+        index = pd.MultiIndex.from_arrays([[], [], []], names=['Niveau', 'Periode', 'Type'])
+        return pd.DataFrame(0, index=index, columns=COLONNES_CUBE)
+    
+    valeurs = pd.DataFrame({
+        'Montant_Gain': data['Montant_Gain'],
+        'Montant_Depense': data['Montant_Depense'],
+        'Montant_Rembourse_Julie': data['Montant_Rembourse_Julie'],
+        'nb_gains': (data['Montant_Gain'] > 0).astype(int),
+        'nb_depenses': (data['Montant_Depense'] > 0).astype(int),
+        'nb_operations': 1
+    }, index=data.index)
+    
+    blocs = []
+    for niveau, freq in [('Tout', None)] + list(NIVEAUX_CUBE.items()):
+        periode = data['Date'].dt.to_period(freq).astype(str) if freq else pd.Series('Tout', index=data.index)
+        cles = [pd.Series(niveau, index=data.index), periode, data['Type']]
+        blocs.append(valeurs.groupby(cles, dropna=False).sum())
+    
+    cube = pd.concat(blocs)
+    cube.index.names = ['Niveau', 'Periode', 'Type']
+    return cube.sort_index()
+
+@st.cache_data(max_entries=4)
+def cube_pour_version(version, _df):
+    """Cube complet, construit une fois par version des données"""
+    return construire_cube(_df)
+
+def obtenir_cube():
+    """Cube de la session : reconstruit seulement si les données ont changé hors de cette session"""
+    if st.session_state.get('cube_version') != st.session_state.data_version:
+        st.session_state.cube = cube_pour_version(st.session_state.data_version, st.session_state.data)
+        st.session_state.cube_version = st.session_state.data_version
+    return st.session_state.cube
+
+def maj_cube(anciennes, nouvelles):
+    """Mise à jour incrémentale du cube de la session après un ajout ou une modification de lignes"""
+    if st.session_state.get('cube_version') != st.session_state.data_version:
+        return
+    cube = st.session_state.cube
+    if anciennes is not None and not anciennes.empty:
+        cube = cube.sub(construire_cube(anciennes), fill_value=0)
+    if nouvelles is not None and not nouvelles.empty:
+        cube = cube.add(construire_cube(nouvelles), fill_value=0)
+    st.session_state.cube = cube.sort_index()
+
+def totaux_operations(data):
+    """Totaux d'une sélection de lignes, au format de totaux_cube (sans construire de cube)"""
+    return pd.Series({
+        'Montant_Gain': data['Montant_Gain'].sum(),
+        'Montant_Depense': data['Montant_Depense'].sum(),
+        'Montant_Rembourse_Julie': data['Montant_Rembourse_Julie'].sum(),
+        'nb_gains': int((data['Montant_Gain'] > 0).sum()),
+        'nb_depenses': int((data['Montant_Depense'] > 0).sum()),
+        'nb_operations': len(data)
+    }, index=COLONNES_CUBE)
+
+def totaux_cube(cube, niveau, periode):
+    """Totaux d'une période, tous types confondus"""
+    try:
+        return cube.loc[(niveau, periode)].sum()
+    except KeyError:
+        return pd.Series(0, index=COLONNES_CUBE)
+
+def serie_cube(cube, niveau, colonne):
+    """Série par période d'un niveau (périodes sans opération ni date exclues)"""
+    if niveau not in cube.index.get_level_values('Niveau'):
+        return pd.Series(dtype=float)
+    periodes = cube.loc[niveau].groupby(level='Periode').sum()
+    periodes = periodes[(periodes['nb_operations'] > 0) & (periodes.index != 'NaT')]
+    return periodes[colonne]
+
+def cle_periode(periode):
+    """(niveau, période) du cube correspondant au filtre de période de la sidebar"""
+    if periode == "Ce mois":
+        return 'Mois', str(pd.Period.now('M'))
+    if periode == "Ce trimestre":
+        return 'Trimestre', str(pd.Period.now('Q'))
+    if periode == "Cette année":
+        return 'Année', str(pd.Period.now('Y'))
+    return 'Tout', 'Tout'
+
+# --- VUES FILTRÉES ---
+@st.cache_data(max_entries=4)
+def lives_tries(version, _df):
+    """Liste des lives pour le filtre, du plus récent au plus ancien"""
+    return sorted(_df['Live_ID'].dropna().unique().tolist(), reverse=True)
+
+@st.cache_resource(max_entries=32)
+def vue_filtree(version, niveau, periode, live, _df):
+    """Lignes correspondant aux filtres (niveau/période du cube et live), une fois par version"""
+    masque = pd.Series(True, index=_df.index)
+    if niveau != 'Tout':
+        masque &= _df[COLONNES_PERIODES[niveau][0]] == periode
+    if live != "Tous":
+        masque &= _df['Live_ID'] == live
+    return _df[masque]
+
+def filtrer_session(periode, live):
+    """Vue filtrée des données de la session, sans copie quand aucun filtre n'est actif"""
+    data = st.session_state.data
+    niveau, cle = cle_periode(periode)
+    if data.empty or (niveau == 'Tout' and live == "Tous"):
+        return data
+    return vue_filtree(st.session_state.data_version, niveau, cle, live, data)
+
+# --- INDEX DES DOUBLONS ---
+@st.cache_data(max_entries=4)
+def index_doublons_pour_version(version, _df):
+    """Index des doublons complet, construit une fois par version des données"""
+    return IndexDoublons(_df)
+
+def obtenir_index_doublons():
+    """Index de la session : reconstruit seulement si les données ont changé hors de cette session"""
+    if st.session_state.get('index_doublons_version') != st.session_state.data_version:
+        st.session_state.index_doublons = index_doublons_pour_version(st.session_state.data_version, st.session_state.data)
+        st.session_state.index_doublons_version = st.session_state.data_version
+    return st.session_state.index_doublons
+
+def maj_index_doublons(anciennes, nouvelles):
+    """Mise à jour incrémentale de l'index de la session après un ajout ou une modification de lignes"""
+    if st.session_state.get('index_doublons_version') != st.session_state.data_version:
+        return
+    index = st.session_state.index_doublons
+    if anciennes is not None and not anciennes.empty:
+        index.retirer(anciennes)
+    if nouvelles is not None and not nouvelles.empty:
+        index.ajouter(nouvelles)
+
+# --- ÉCRITURES DE LA SESSION ---
+def relancer_fragment():
+    """Réexécute seulement le fragment courant (toute la page s'il tourne dans une exécution complète)"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def suivre_version_registre(version_avant):
+    """Après une écriture de la session : si elle seule a changé le registre, les données,
+    le cube et l'index de la session correspondent à la nouvelle version (pas de rechargement)"""
+    ancienne = st.session_state.data_version
+    if ancienne != version_avant or ledger.version != version_avant + 1:
+        return
+    for cle in ['data_version', 'cube_version', 'index_doublons_version']:
+        if st.session_state.get(cle) == ancienne:
+            st.session_state[cle] = ledger.version
+
+def ajouter_operations(new_rows):
+    """Ajoute des opérations à la session, au registre local et au cube"""
+    version_avant = ledger.version
+    if not append_data(new_rows):
+        return False
+    data = pd.concat([st.session_state.data, ajouter_periodes(new_rows.copy())], ignore_index=True)
+    # Catégories différentes de part et d'autre : le concat retombe en texte
+    for col, _ in COLONNES_PERIODES.values():
+        data[col] = data[col].astype('category')
+    st.session_state.data = typer_categories(typer_dates(data))
+    maj_cube(None, new_rows)
+    maj_index_doublons(None, new_rows)
+    suivre_version_registre(version_avant)
+    return True
+
+def modifier_operations(updates):
+    """Applique {ID_Operation: {colonne: valeur}} à la session, au registre local et au cube"""
+    version_avant = ledger.version
+    data = st.session_state.data
+    lignes = data['ID_Operation'].isin(list(updates))
+    anciennes = data[lignes].copy()
+    
+    # Valeurs sur lesquelles la session s'est basée (contrôle optimiste)
+    lues = anciennes.set_index('ID_Operation').to_dict('index')
+    attendues = {
+        op_id: {col: lues[op_id].get(col) for col in ['Revision', *changes]}
+        for op_id, changes in updates.items() if op_id in lues
     }
+    revisions = patch_data(updates, attendues)
+    if revisions is None:
+        if 'conflit_ecriture' in st.session_state:
+            st.rerun()
+        return False
+    appliquer_patch(data, {op_id: {**updates[op_id], 'Revision': rev} for op_id, rev in revisions.items()})
+    maj_cube(anciennes, data[lignes])
+    maj_index_doublons(anciennes, data[lignes])
+    suivre_version_registre(version_avant)
+    return True
 
-metriques = calculer_metriques(df)
+def supprimer_operations(ids):
+    """Retire des opérations de la session, du registre local et du cube"""
+    version_avant = ledger.version
+    data = st.session_state.data
+    lignes = data['ID_Operation'].isin(ids)
+    anciennes = data[lignes]
+    if not delete_data(list(ids)):
+        return False
+    st.session_state.data = data[~lignes].reset_index(drop=True)
+    maj_cube(anciennes, None)
+    maj_index_doublons(anciennes, None)
+    suivre_version_registre(version_avant)
+    return True
 
-# --- SIDEBAR : FILTRES ET SAISIE ---
-with st.sidebar:
-    # FILTRES
-    st.markdown("## 🔍 Filtres")
-    
-    # Filtre période
-    periode_options = ["Tout", "Ce mois", "Ce trimestre", "Cette année"]
-    periode = st.selectbox("📅 Période", periode_options, key="filtre_periode")
-    
-    # Filtre Live
-    if not df.empty and df['Live_ID'].notna().any():
-        lives_list = ["Tous"] + sorted(df[df['Live_ID'].notna()]['Live_ID'].unique().tolist(), reverse=True)
-        live_filtre = st.selectbox("🎬 Live", lives_list, key="filtre_live")
-    else:
-        live_filtre = "Tous"
-    
-    # Application des filtres
-    df_filtered = df.copy()
-    
-    if not df_filtered.empty:
-        if periode == "Ce mois":
-            df_filtered = df_filtered[df_filtered['Date'].dt.to_period('M') == pd.Period.now('M')]
-        elif periode == "Ce trimestre":
-            df_filtered = df_filtered[df_filtered['Date'].dt.to_period('Q') == pd.Period.now('Q')]
-        elif periode == "Cette année":
-            df_filtered = df_filtered[df_filtered['Date'].dt.year == datetime.now().year]
+# --- LISTES PAGINÉES ---
+LIGNES_PAR_PAGE = 20
+
+def paginer(data, key, par_page=LIGNES_PAR_PAGE):
+    """Découpe data en pages ; retourne (lignes de la page, page, nombre de pages)"""
+    nb_pages = max(1, (len(data) - 1) // par_page + 1)
+    page = st.selectbox("Page", range(1, nb_pages + 1), key=key) if nb_pages > 1 else 1
+    return data.iloc[(page - 1) * par_page:page * par_page], page, nb_pages
+
+def filtrer_trier_paginer(data, key, tris):
+    """Recherche, tri et pagination côté serveur : seule la page affichée crée des widgets"""
+    col_recherche, col_tri, col_page = st.columns([3, 2, 1])
+    
+    with col_recherche:
+        recherche = st.text_input("🔎 Rechercher", key=f"{key}_recherche", placeholder="Description ou live...")
+    with col_tri:
+        tri = st.selectbox("Trier par", list(tris), key=f"{key}_tri")
+    
+    if recherche:
+        texte = data['Description'].fillna('').astype(str) + ' ' + data['Live_ID'].astype(object).fillna('').astype(str)
+        data = data[texte.str.contains(recherche, case=False, regex=False)]
+    
+    colonne, croissant = tris[tri]
+    data = data.sort_values(colonne, ascending=croissant)
+    
+    with col_page:
+        page_data, page, nb_pages = paginer(data, f"{key}_page")
+    st.caption(f"{len(data)} résultat(s) - page {page} / {nb_pages}")
+    return page_data
+
+# --- REMBOURSEMENT INDIVIDUEL ---
+@st.fragment
+def carte_remboursement(op_id):
+    """Gain à rembourser ; un remboursement ne réexécute que cette carte, relue depuis la session"""
+    data = st.session_state.data
+    row = colonnes_en_euros(data[data['ID_Operation'] == op_id]).iloc[0]
+    part_julie = row['Montant_Gain'] / 2
+    deja_rembourse = row['Montant_Rembourse_Julie']
+    reste_a_rembourser = part_julie - deja_rembourse
+    progression_gain = deja_rembourse / part_julie * 100
+    
+    message = st.session_state.pop(f"message_remb_{op_id}", None)
+    if message:
+        st.success(message)
+        julie = metriques_depuis_totaux(totaux_cube(obtenir_cube(), 'Tout', 'Tout'))
+        st.caption(f"⏳ Reste à recevoir pour Julie : {julie['julie_restant']:.2f} €")
+    if row['Statut_Remb_Julie'] == 'Payé':
+        st.success(f"🎉 {row['Description']} : {part_julie:.2f} € entièrement remboursés")
+        return
+    
+    with st.expander(
+        f"💰 {part_julie:.2f} € - {row['Description']} (Reste: {reste_a_rembourser:.2f} €)",
+        expanded=False
+    ):
+        col_info1, col_info2 = st.columns(2)
         
-        if live_filtre != "Tous":
-            df_filtered = df_filtered[df_filtered['Live_ID'] == live_filtre]
-    
-    st.divider()
-    
-    # SCANNER
-    st.markdown("## 📸 Scanner un Ticket")
-    
-    uploaded_file = st.file_uploader(
-        "Prendre une photo du ticket", 
-        type=['jpg', 'jpeg', 'png'],
-        help="Prenez une photo claire du ticket"
+        with col_info1:
+            st.write(f"📅 **Date:** {row['Date'].strftime('%d/%m/%Y')}")
+            st.write(f"🏷️ **Type:** {row['Type']}")
+            st.write(f"💵 **Gain total:** {row['Montant_Gain']:.2f} €")
+            if pd.notna(row['Live_ID']):
+                st.write(f"🎬 **Live:** {row['Live_ID']}")
+        
+        with col_info2:
+            st.write(f"👤 **Part Julie (50%):** {part_julie:.2f} €")
+            st.write(f"✅ **Déjà remboursé:** {deja_rembourse:.2f} €")
+            st.write(f"⏳ **Reste:** {reste_a_rembourser:.2f} €")
+            st.progress(progression_gain / 100)
+        
+        if pd.notna(row['Notes']) and row['Notes']:
+            st.info(f"📌 {row['Notes']}")
+        
+        st.markdown("#### 💳 Rembourser")
+        
+        col_form1, col_form2 = st.columns([3, 1])
+        
+        with col_form1:
+            montant_remb = st.number_input(
+                "Montant à rembourser (€)",
+                min_value=0.01,
+                max_value=float(reste_a_rembourser),
+                value=float(reste_a_rembourser),
+                step=0.01,
+                key=f"remb_{op_id}"
+            )
+        
+        with col_form2:
+            if st.button("💸 Rembourser", key=f"btn_remb_{op_id}", use_container_width=True):
+                nouveau_total_remb = en_centimes(deja_rembourse) + en_centimes(montant_remb)
+                changes = {'Montant_Rembourse_Julie': nouveau_total_remb}
+                
+                if nouveau_total_remb >= en_centimes(part_julie):
+                    changes['Statut_Remb_Julie'] = 'Payé'
+                    changes['Date_Remb_Complete_Julie'] = datetime.now()
+                
+                if modifier_operations({op_id: changes}):
+                    st.session_state[f"message_remb_{op_id}"] = f"✅ {montant_remb:.2f} € remboursé à Julie !"
+                    st.session_state.pop(f"remb_{op_id}", None)
+                    relancer_fragment()
+
+# --- SYNTHÈSE PAR LIVE ---
+LIVES_PAR_PAGE = 10
+
+@st.cache_data(max_entries=4)
+def resume_lives(version, _df):
+    """Synthèse de tous les lives en un seul groupby, calculée une fois par version des données"""
+    lives = _df[_df['Live_ID'].notna()]
+    resume = lives.groupby('Live_ID').agg(
+        gain_brut=('Montant_Gain', 'sum'),
+        depense_stock=('Montant_Depense', 'sum'),
+        date=('Date', 'max'),
+        nb_operations=('Live_ID', 'size')
+    )
+    resume['benefice'] = resume['gain_brut'] - resume['depense_stock']
+    resume[['gain_brut', 'depense_stock', 'benefice']] /= 100
+    return resume.sort_index(ascending=False)
+
+# --- GRAPHIQUES ---
+MAX_POINTS_GRAPHIQUE = 400
+
+def indices_lttb(x, y, seuil=MAX_POINTS_GRAPHIQUE):
+    """Indices des points conservés par Largest-Triangle-Three-Buckets (forme de la courbe préservée)"""
+    n = len(x)
+    if n <= seuil or seuil < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    
+    # seuil - 2 seaux entre le premier et le dernier point, toujours conservés
+    bornes = np.linspace(1, n - 1, seuil - 1).astype(int)
+    indices = np.empty(seuil, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(seuil - 2):
+        debut, fin = bornes[i], bornes[i + 1]
+        fin_suivant = bornes[i + 2] if i + 2 < len(bornes) else n
+        moy_x, moy_y = x[fin:fin_suivant].mean(), y[fin:fin_suivant].mean()
+        # Point du seau formant le plus grand triangle avec le point retenu précédent et la moyenne du seau suivant
+        aires = np.abs((x[a] - moy_x) * (y[debut:fin] - y[a]) - (x[a] - x[debut:fin]) * (moy_y - y[a]))
+        a = debut + int(np.argmax(aires))
+        indices[i + 1] = a
+    return indices
+
+def sous_echantillonner(data, x, y, seuil=MAX_POINTS_GRAPHIQUE):
+    """Lignes de data à tracer : au plus seuil points, choisis par LTTB sur (x, y)"""
+    if len(data) <= seuil:
+        return data
+    abscisses = data[x]
+    if pd.api.types.is_datetime64_any_dtype(abscisses):
+        abscisses = abscisses.astype('int64')
+    elif not pd.api.types.is_numeric_dtype(abscisses):
+        abscisses = np.arange(len(data))
+    return data.iloc[indices_lttb(abscisses, data[y], seuil)]
+
+# Figures réutilisées tant que les données et les filtres sont les mêmes : Plotly n'est rappelé qu'au changement
+@st.cache_resource(max_entries=16)
+def figure_ca_mensuel(version, filtres, _data):
+    """Aire du CA brut mensuel des données filtrées"""
+    df_gains = colonnes_en_euros(_data[_data['Montant_Gain'] > 0])
+    if df_gains.empty:
+        return None
+    monthly_ca = df_gains.groupby('_Mois', observed=True)['Montant_Gain'].sum().reset_index()
+    monthly_ca.columns = ['Mois', 'Montant_Gain']
+    monthly_ca = sous_echantillonner(monthly_ca, 'Mois', 'Montant_Gain')
+    
+    fig_ca = px.area(
+        monthly_ca, 
+        x='Mois', 
+        y='Montant_Gain',
+        title="",
+        labels={'Montant_Gain': 'CA (€)', 'Mois': ''}
+    )
+    fig_ca.update_traces(line_color='#10b981', fillcolor='rgba(16, 185, 129, 0.3)')
+    fig_ca.update_layout(hovermode='x unified')
+    return fig_ca
+
+@st.cache_resource(max_entries=16)
+def figure_gains_depenses(ca_brut, depenses, benefice_net):
+    """Barres gains / dépenses / bénéfice, reconstruites seulement si ces totaux changent"""
+    totaux = pd.DataFrame({
+        'Catégorie': ['Gains', 'Dépenses', 'Bénéfice Net'],
+        'Montant': [ca_brut, depenses, benefice_net]
+    })
+    
+    return px.bar(
+        totaux,
+        x='Catégorie',
+        y='Montant',
+        color='Catégorie',
+        color_discrete_map={
+            'Gains': '#10b981',
+            'Dépenses': '#ef4444',
+            'Bénéfice Net': '#3b82f6'
+        }
+    )
+
+@st.cache_resource(max_entries=16)
+def figure_top_depenses(version, filtres, _data):
+    """Top 5 des dépenses des données filtrées"""
+    depenses_df = _data[_data['Montant_Depense'] > 0]
+    if depenses_df.empty:
+        return None
+    top_depenses = colonnes_en_euros(depenses_df.nlargest(5, 'Montant_Depense'))
+    
+    return px.bar(
+        top_depenses,
+        x='Description',
+        y='Montant_Depense',
+        color='Montant_Depense',
+        color_continuous_scale='Reds'
+    )
+
+@st.cache_resource(max_entries=4)
+def figure_argent_matheo(version, _df):
+    """Courbe cumulée de la part de Mathéo débloquée au fil des remboursements"""
+    gains_payes = colonnes_en_euros(_df[(_df['Montant_Gain'] > 0) & (_df['Statut_Remb_Julie'] == 'Payé')])
+    if gains_payes.empty:
+        return None
+    gains_payes = gains_payes.sort_values('Date_Remb_Complete_Julie')
+    gains_payes['Part_Matheo_Cumulative'] = (gains_payes['Montant_Gain'] / 2).cumsum()
+    # Un point par gain payé : la courbe est réduite pour garder un envoi au navigateur borné
+    gains_payes = sous_echantillonner(
+        gains_payes.dropna(subset=['Date_Remb_Complete_Julie']), 'Date_Remb_Complete_Julie', 'Part_Matheo_Cumulative'
     )
     
-    if uploaded_file:
-        img = Image.open(uploaded_file)
-        st.image(img, caption="Aperçu", use_container_width=True)
+    fig_matheo = px.line(
+        gains_payes,
+        x='Date_Remb_Complete_Julie',
+        y='Part_Matheo_Cumulative',
+        title="",
+        labels={
+            'Date_Remb_Complete_Julie': 'Date',
+            'Part_Matheo_Cumulative': 'Argent Disponible (€)'
+        }
+    )
+    fig_matheo.update_traces(line_color='#3b82f6', line_width=3)
+    fig_matheo.update_layout(hovermode='x unified')
+    return fig_matheo
+
+# --- EXPORTS ---
+# Fichiers générés au clic sur le bouton de téléchargement (thread séparé), une fois par version des données
+TAILLE_BLOC_EXPORT = 5000
+
+@st.cache_data(max_entries=2)
+def export_csv(version, _data):
+    """CSV des données, écrit par blocs de lignes"""
+    sortie = BytesIO()
+    _data.to_csv(sortie, index=False, encoding='utf-8', chunksize=TAILLE_BLOC_EXPORT)
+    return sortie.getvalue()
+
+@st.cache_data(max_entries=2)
+def export_excel(version, _data, _metriques):
+    """Classeur Excel : données + métriques"""
+    sortie = BytesIO()
+    with pd.ExcelWriter(sortie, engine='openpyxl') as writer:
+        _data.to_excel(writer, index=False, sheet_name='Données')
         
-        if st.button("🔍 Analyser le ticket", use_container_width=True):
-            with st.spinner("Analyse en cours..."):
-                scan_date, scan_name, scan_price = extract_ticket_data(img)
-                st.session_state['scan_date'] = scan_date
-                st.session_state['scan_name'] = scan_name
-                st.session_state['scan_price'] = scan_price
-                st.session_state['ticket_scanned'] = True
-                st.success("✅ Ticket analysé - Formulaire pré-rempli !")
-                st.balloons()
-                st.rerun()
+        # Feuille métriques
+        pd.DataFrame([_metriques]).to_excel(writer, index=False, sheet_name='Métriques')
+    return sortie.getvalue()
+
+@st.cache_data(max_entries=2)
+def export_parquet(version, _data):
+    """Parquet des données (types conservés, compressé)"""
+    sortie = BytesIO()
+    _data.to_parquet(sortie, index=False)
+    return sortie.getvalue()
+
+# --- IMPORT DES EXPORTS WHATNOT ---
+@st.cache_data(max_entries=2)
+def lire_import_whatnot(contenu, live_id):
+    """Ventes d'un export CSV Whatnot, analysées une fois par fichier"""
+    return lire_export_whatnot(BytesIO(contenu), live_id or None)
+
+# --- RAPPORT PDF EN ARRIÈRE-PLAN ---
+@st.cache_resource
+def get_travaux_rapports():
+    """Rapports PDF partagés entre sessions, générés hors du script Streamlit"""
+    return TravauxRapports()
+
+travaux_rapports = get_travaux_rapports()
+
+@st.fragment(run_every=1)
+def suivi_rapport_pdf(cle):
+    """Attend la fin de la génération du rapport puis réaffiche la page avec le bouton de téléchargement"""
+    if travaux_rapports.etat(cle) is False:
+        st.caption("⏳ Génération du rapport PDF en cours...")
+        return
+    st.rerun()
+
+cube = obtenir_cube()
+metriques = metriques_depuis_totaux(totaux_cube(cube, 'Tout', 'Tout'))
+
+# --- ANALYSE DES TICKETS EN ARRIÈRE-PLAN ---
+@st.cache_resource
+def get_travaux_ocr():
+    """File des analyses OCR partagée, exécutée hors du script Streamlit"""
+    return TravauxOCR()
+
+travaux_ocr = get_travaux_ocr()
+
+def tableau_lot_tickets(noms, resultats):
+    """Grille de validation d'un lot de tickets analysés (les doublons probables sont décochés)"""
+    index_doublons = obtenir_index_doublons()
+    doublons = [bool(index_doublons.chercher(r['Date'], r['Magasin'], r['Montant'], flou=True)) for r in resultats]
+    return pd.DataFrame({
+        'Valider': [
+            r['Erreur'] is None and r['Montant'] > 0 and 'Montant' not in r.get('A_verifier', []) and not doublon
+            for r, doublon in zip(resultats, doublons)
+        ],
+        'Fichier': noms,
+        'Date': [pd.to_datetime(r['Date']).date() for r in resultats],
+        'Description': [r['Magasin'] for r in resultats],
+        'Montant': [float(r['Montant']) for r in resultats],
+        'Type': TYPES_OPERATION[1],
+        'Live_ID': '',
+        'A_verifier': [', '.join(r.get('A_verifier', [])) for r in resultats],
+        'Doublon': doublons,
+        'Erreur': [r['Erreur'] or '' for r in resultats]
+    })
+
+@st.fragment(run_every=1)
+def suivi_analyse_ocr():
+    """Suit le travail OCR en cours ; à son arrivée, pré-remplit le formulaire ou la grille du lot"""
+    job = st.session_state.ocr_job
+    etat = travaux_ocr.etat(job['id'])
+    if etat is None:
+        st.session_state.pop('ocr_job', None)
+        st.rerun()
     
-    st.divider()
+    termine, faits, total = etat
+    if not termine:
+        if job['noms']:
+            st.progress(faits / total, text=f"Analyse en cours... {faits}/{total}")
+        else:
+            st.caption("⏳ Analyse du ticket en cours, la saisie reste disponible")
+        return
+    
+    st.session_state.pop('ocr_job', None)
+    try:
+        resultat = travaux_ocr.resultat(job['id'])
+    except Exception as e:
+        st.toast(f"❌ Erreur OCR : {e}")
+        st.rerun()
     
-    # FORMULAIRE
+    if job['noms']:
+        st.session_state['scan_batch'] = tableau_lot_tickets(job['noms'], resultat)
+    else:
+        if resultat['Erreur']:
+            st.toast(f"❌ Erreur OCR : {resultat['Erreur']}")
+        st.session_state['scan_date'] = resultat['Date']
+        st.session_state['scan_name'] = resultat['Magasin']
+        st.session_state['scan_price'] = resultat['Montant']
+        st.session_state['scan_a_verifier'] = resultat.get('A_verifier', [])
+        st.session_state['ticket_scanned'] = True
+        st.toast("✅ Ticket analysé - Formulaire pré-rempli !")
+    st.rerun()
+
+@st.fragment
+def formulaire_operation():
+    """Saisie d'une opération ; les tableaux de bord se mettent à jour à l'interaction suivante"""
     st.markdown("## ➕ Nouvelle Opération")
     
+    # Messages de l'enregistrement précédent, conservés à travers la réexécution du fragment
+    for niveau, message in st.session_state.pop('messages_saisie', []):
+        getattr(st, niveau)(message)
+    if 'derniere_saisie' in st.session_state:
+        totaux = metriques_depuis_totaux(totaux_cube(obtenir_cube(), 'Tout', 'Tout'))
+        st.caption(
+            f"{st.session_state.derniere_saisie} · CA brut {totaux['ca_brut']:.2f} € · "
+            f"bénéfice {totaux['benefice_net']:.2f} €"
+        )
+    
     if st.session_state.get('ticket_scanned', False):
         st.success("📸 Ticket scanné → Pré-rempli en Dépense Stock !")
+        if st.session_state.get('scan_a_verifier'):
+            st.warning(f"🔎 Lecture incertaine, à vérifier : {', '.join(st.session_state.scan_a_verifier)}")
     
     with st.form("new_operation", clear_on_submit=False):
         date_input = st.date_input(
@@ -352,7 +1166,7 @@ with st.sidebar:
         )
         
         # Pré-sélection automatique de "Dépense Stock Live" si ticket scanné
-        type_options = ["💰 Gain Live", "🛒 Dépense Stock Live", "💸 Frais Divers"]
+        type_options = TYPES_OPERATION
         default_type_index = 1 if st.session_state.get('ticket_scanned', False) else 0
         
         type_input = st.selectbox(
@@ -399,77 +1213,178 @@ with st.sidebar:
         
         if cancel_btn:
             # Réinitialiser les valeurs du scan
-            for key in ['scan_date', 'scan_name', 'scan_price', 'ticket_scanned']:
+            for key in ['scan_date', 'scan_name', 'scan_price', 'scan_a_verifier', 'ticket_scanned']:
                 st.session_state.pop(key, None)
-            st.rerun()
+            relancer_fragment()
         
         if submit_btn:
             if desc_input and montant_input > 0:
+                messages = []
+                
                 # Validation montant élevé
                 if montant_input > 1000:
-                    st.warning("⚠️ Montant élevé (> 1000€)")
+                    messages.append(('warning', "⚠️ Montant élevé (> 1000€)"))
                 
-                # Détection doublons
-                duplicates = df[
-                    (df['Date'] == pd.to_datetime(date_input)) &
-                    (df['Description'] == desc_input) &
-                    ((df['Montant_Gain'] == montant_input) | (df['Montant_Depense'] == montant_input))
-                ]
-                if not duplicates.empty:
-                    st.warning("⚠️ Opération similaire existante !")
-                
-                # Génération auto du Live ID si nécessaire
-                if "Live" in type_input and not live_id_input:
-                    live_id_input = f"LIVE_{date_input.strftime('%Y%m%d_%H%M%S')}"
-                
-                # Type de montant
-                montant_gain = montant_input if "Gain" in type_input else 0
-                montant_depense = montant_input if "Dépense" in type_input or "Frais" in type_input else 0
+                # Détection doublons (approximative pour les noms lus par OCR)
+                if obtenir_index_doublons().chercher(
+                    date_input, desc_input, montant_input, flou=st.session_state.get('ticket_scanned', False)
+                ):
+                    messages.append(('warning', "⚠️ Opération similaire existante !"))
                 
                 # Nouvelle ligne
-                new_entry = pd.DataFrame([{
-                    "Date": pd.to_datetime(date_input),
-                    "Type": type_input,
-                    "Description": desc_input,
-                    "Montant_Gain": montant_gain,
-                    "Montant_Depense": montant_depense,
-                    "Live_ID": live_id_input,
-                    "Montant_Rembourse_Julie": 0,
-                    "Statut_Remb_Julie": "En attente" if montant_gain > 0 else "N/A",
-                    "Date_Remb_Complete_Julie": None,
-                    "Année": str(date_input.year),
-                    "Notes": notes_input
-                }])
+                new_entry = pd.DataFrame([creer_operation(
+                    date_input, type_input, desc_input, montant_input, live_id_input, notes_input
+                )])
                 
                 # Ajout et sauvegarde
-                st.session_state.data = pd.concat([st.session_state.data, new_entry], ignore_index=True)
-                
-                if save_data(st.session_state.data):
-                    st.success("✅ Opération enregistrée !")
+                if ajouter_operations(new_entry):
+                    st.session_state['messages_saisie'] = [('success', "✅ Opération enregistrée !")] + messages
+                    st.session_state['derniere_saisie'] = f"Dernière saisie : {desc_input} ({montant_input:.2f} €)"
                     
                     # Reset APRÈS enregistrement
-                    for key in ['scan_date', 'scan_name', 'scan_price', 'ticket_scanned']:
+                    for key in ['scan_date', 'scan_name', 'scan_price', 'scan_a_verifier', 'ticket_scanned']:
                         st.session_state.pop(key, None)
                     
-                    st.rerun()
+                    relancer_fragment()
             else:
                 st.error("⚠️ Remplissez tous les champs obligatoires")
 
-# Recalculer métriques avec filtres
-metriques_filtered = calculer_metriques(df_filtered)
+# --- SIDEBAR : FILTRES ET SAISIE ---
+with st.sidebar:
+    # SYNCHRONISATION
+    nb_en_attente = ledger.pending_count()
+    if nb_en_attente:
+        st.caption(f"⏳ {nb_en_attente} modification(s) en attente d'envoi vers Google Sheets")
+    if ledger.last_error:
+        st.caption(f"⚠️ Synchronisation en échec : {ledger.last_error}")
+    if ledger.last_conflict:
+        st.caption(f"⚠️ Conflit avec Google Sheets, la version de la feuille est conservée : {ledger.last_conflict}")
+    if 'conflit_ecriture' in st.session_state:
+        st.warning(st.session_state.pop('conflit_ecriture'))
+    
+    # FILTRES
+    st.markdown("## 🔍 Filtres")
+    
+    # Filtre période
+    periode_options = ["Tout", "Ce mois", "Ce trimestre", "Cette année"]
+    periode = st.selectbox("📅 Période", periode_options, key="filtre_periode")
+    
+    # Filtre Live
+    if not df.empty and df['Live_ID'].notna().any():
+        lives_list = ["Tous"] + lives_tries(st.session_state.data_version, df)
+        live_filtre = st.selectbox("🎬 Live", lives_list, key="filtre_live")
+    else:
+        live_filtre = "Tous"
+    
+    # Application des filtres (vue mise en cache par version des données)
+    df_filtered = filtrer_session(periode, live_filtre)
+    filtres_actifs = (*cle_periode(periode), live_filtre)
+    
+    st.divider()
+    
+    # SCANNER
+    st.markdown("## 📸 Scanner un Ticket")
+    
+    uploaded_files = st.file_uploader(
+        "Prendre une photo du ticket", 
+        type=['jpg', 'jpeg', 'png'],
+        accept_multiple_files=True,
+        help="Prenez une photo claire du ticket (plusieurs tickets possibles)"
+    )
+    
+    if len(uploaded_files) == 1:
+        uploaded_file = uploaded_files[0]
+        img = Image.open(uploaded_file)
+        st.image(img, caption="Aperçu", use_container_width=True)
+        
+        if st.button("🔍 Analyser le ticket", use_container_width=True, disabled='ocr_job' in st.session_state):
+            st.session_state['ocr_job'] = {'id': travaux_ocr.soumettre_ticket(uploaded_file.getvalue()), 'noms': None}
+    
+    elif len(uploaded_files) > 1:
+        # Lot de tickets : analyse parallèle puis validation dans une grille
+        st.caption(f"📸 {len(uploaded_files)} tickets sélectionnés")
+        
+        if st.button(f"🔍 Analyser les {len(uploaded_files)} tickets", use_container_width=True, disabled='ocr_job' in st.session_state):
+            st.session_state['ocr_job'] = {
+                'id': travaux_ocr.soumettre_lot([f.getvalue() for f in uploaded_files]),
+                'noms': [f.name for f in uploaded_files]
+            }
+    
+    # Suivi de l'analyse sans bloquer le reste de la page
+    if 'ocr_job' in st.session_state:
+        suivi_analyse_ocr()
+    
+    st.divider()
+    
+    # FORMULAIRE (fragment : un enregistrement ne réexécute que le formulaire)
+    formulaire_operation()
+
+# Recalculer métriques avec filtres (cube, ou agrégation du seul live filtré)
+if live_filtre == "Tous":
+    totaux_filtered = totaux_cube(cube, *cle_periode(periode))
+else:
+    totaux_filtered = totaux_operations(df_filtered)
+metriques_filtered = metriques_depuis_totaux(totaux_filtered)
+
+# --- VALIDATION DES TICKETS SCANNÉS EN LOT ---
+if 'scan_batch' in st.session_state:
+    with st.expander(f"📸 {len(st.session_state.scan_batch)} ticket(s) scanné(s) à valider", expanded=True):
+        tickets = st.data_editor(
+            st.session_state.scan_batch,
+            column_config={
+                "Valider": st.column_config.CheckboxColumn("✅"),
+                "Fichier": st.column_config.TextColumn("Fichier", disabled=True),
+                "Date": st.column_config.DateColumn("Date", format="DD/MM/YYYY"),
+                "Montant": st.column_config.NumberColumn("Montant", format="%.2f €", min_value=0.0),
+                "Type": st.column_config.SelectboxColumn("Type", options=TYPES_OPERATION, required=True),
+                "Live_ID": st.column_config.TextColumn("Live", help="Auto-généré si vide"),
+                "A_verifier": st.column_config.TextColumn("🔎 À vérifier", disabled=True),
+                "Doublon": st.column_config.CheckboxColumn("⚠️ Doublon", disabled=True),
+                "Erreur": st.column_config.TextColumn("Erreur OCR", disabled=True)
+            },
+            use_container_width=True,
+            hide_index=True,
+            key="scan_batch_editor"
+        )
+        
+        col_lot1, col_lot2 = st.columns(2)
+        
+        with col_lot1:
+            if st.button("💾 Enregistrer les tickets validés", use_container_width=True, type="primary"):
+                valides = tickets[tickets['Valider'] & (tickets['Montant'] > 0) & tickets['Date'].notna()]
+                
+                if valides.empty:
+                    st.warning("⚠️ Aucun ticket validé avec un montant")
+                else:
+                    # Un seul ajout groupé pour tout le lot
+                    new_rows = pd.DataFrame([
+                        creer_operation(t.Date, t.Type, t.Description, t.Montant, t.Live_ID if pd.notna(t.Live_ID) and t.Live_ID else None)
+                        for t in valides.itertuples()
+                    ])
+                    if ajouter_operations(new_rows):
+                        st.success(f"✅ {len(new_rows)} ticket(s) enregistré(s) !")
+                        st.session_state.pop('scan_batch', None)
+                        st.rerun()
+        
+        with col_lot2:
+            if st.button("🗑️ Abandonner le lot", use_container_width=True):
+                st.session_state.pop('scan_batch', None)
+                st.rerun()
 
 # --- ONGLETS PRINCIPAUX ---
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
+# Seule la section choisie est exécutée (st.tabs exécutait les six à chaque interaction)
+ONGLETS = [
     "📊 Dashboard", 
     "🎬 Historique Lives",
     "💰 Remboursements Julie", 
     "👨‍💻 Mathéo", 
     "🎯 Objectifs",
     "📋 Données"
-])
+]
+onglet = st.radio("Section", ONGLETS, horizontal=True, key="onglet", label_visibility="collapsed")
 
 # ========== TAB 1 : DASHBOARD AMÉLIORÉ ==========
-with tab1:
+if onglet == ONGLETS[0]:
     st.markdown("### 📈 Performance Globale")
     
     # Métriques principales
@@ -513,7 +1428,7 @@ with tab1:
     col_s1, col_s2, col_s3, col_s4 = st.columns(4)
     
     with col_s1:
-        nb_operations_gain = len(df_filtered[df_filtered['Montant_Gain'] > 0])
+        nb_operations_gain = totaux_filtered['nb_gains']
         ticket_moyen = metriques_filtered['ca_brut'] / nb_operations_gain if nb_operations_gain > 0 else 0
         st.metric("🎫 Ticket Moyen", f"{ticket_moyen:.2f} €")
     
@@ -526,7 +1441,7 @@ with tab1:
         st.metric("💰 CA Moyen/Live", f"{ca_par_live:.2f} €")
     
     with col_s4:
-        nb_depenses = len(df_filtered[df_filtered['Montant_Depense'] > 0])
+        nb_depenses = totaux_filtered['nb_depenses']
         depense_moyenne = metriques_filtered['total_depenses_live'] / nb_depenses if nb_depenses > 0 else 0
         st.metric("🛒 Dépense Moyenne", f"{depense_moyenne:.2f} €")
     
@@ -591,24 +1506,23 @@ with tab1:
         st.markdown("### 📊 Comparaison Mensuelle")
         
         now = pd.Period.now('M')
-        mois_actuel_data = df[df['Date'].dt.to_period('M') == now]
-        mois_precedent_data = df[df['Date'].dt.to_period('M') == (now - 1)]
+        ca_mensuel = serie_cube(cube, 'Mois', 'Montant_Gain') / 100
         
         col_c1, col_c2, col_c3 = st.columns(3)
         
         with col_c1:
-            ca_actuel = mois_actuel_data['Montant_Gain'].sum()
+            ca_actuel = ca_mensuel.get(str(now), 0)
             st.metric("💰 Ce mois", f"{ca_actuel:.2f} €")
         
         with col_c2:
-            ca_precedent = mois_precedent_data['Montant_Gain'].sum()
+            ca_precedent = ca_mensuel.get(str(now - 1), 0)
             evolution = ((ca_actuel - ca_precedent) / ca_precedent * 100) if ca_precedent > 0 else 0
             st.metric("📅 Mois précédent", f"{ca_precedent:.2f} €", f"{evolution:+.1f}%")
         
         with col_c3:
             # Projection 3 mois
-            if df['Date'].dt.to_period('M').nunique() > 0:
-                ca_moyen_mensuel = df['Montant_Gain'].sum() / df['Date'].dt.to_period('M').nunique()
+            if len(ca_mensuel) > 0:
+                ca_moyen_mensuel = metriques['ca_brut'] / len(ca_mensuel)
                 projection_3_mois = ca_moyen_mensuel * 3
                 st.metric("🔮 Projection 3 mois", f"{projection_3_mois:.2f} €")
         
@@ -620,60 +1534,23 @@ with tab1:
         
         with col_g1:
             st.markdown("#### 📅 Évolution Mensuelle du CA Brut")
-            df_gains = df_filtered[df_filtered['Montant_Gain'] > 0].copy()
-            if not df_gains.empty:
-                df_gains['Mois'] = df_gains['Date'].dt.to_period('M').astype(str)
-                monthly_ca = df_gains.groupby('Mois')['Montant_Gain'].sum().reset_index()
-                
-                fig_ca = px.area(
-                    monthly_ca, 
-                    x='Mois', 
-                    y='Montant_Gain',
-                    title="",
-                    labels={'Montant_Gain': 'CA (€)', 'Mois': ''}
-                )
-                fig_ca.update_traces(line_color='#10b981', fillcolor='rgba(16, 185, 129, 0.3)')
-                fig_ca.update_layout(hovermode='x unified')
+            fig_ca = figure_ca_mensuel(st.session_state.data_version, filtres_actifs, df_filtered)
+            if fig_ca is not None:
                 st.plotly_chart(fig_ca, use_container_width=True)
         
         with col_g2:
             st.markdown("#### 💰 Gains vs Dépenses")
-            totaux = pd.DataFrame({
-                'Catégorie': ['Gains', 'Dépenses', 'Bénéfice Net'],
-                'Montant': [
-                    metriques_filtered['ca_brut'],
-                    metriques_filtered['total_depenses_live'],
-                    metriques_filtered['benefice_net']
-                ]
-            })
-            
-            fig_bar = px.bar(
-                totaux,
-                x='Catégorie',
-                y='Montant',
-                color='Catégorie',
-                color_discrete_map={
-                    'Gains': '#10b981',
-                    'Dépenses': '#ef4444',
-                    'Bénéfice Net': '#3b82f6'
-                }
+            fig_bar = figure_gains_depenses(
+                metriques_filtered['ca_brut'],
+                metriques_filtered['total_depenses_live'],
+                metriques_filtered['benefice_net']
             )
             st.plotly_chart(fig_bar, use_container_width=True)
         
         # Top 5 dépenses - FIX du bug
         st.markdown("#### 🏆 Top 5 Dépenses")
-        depenses_df = df_filtered[df_filtered['Montant_Depense'] > 0].copy()
-        if not depenses_df.empty and len(depenses_df) > 0:
-            # Trier et prendre les 5 premiers
-            top_depenses = depenses_df.sort_values('Montant_Depense', ascending=False).head(5)
-            
-            fig_top = px.bar(
-                top_depenses,
-                x='Description',
-                y='Montant_Depense',
-                color='Montant_Depense',
-                color_continuous_scale='Reds'
-            )
+        fig_top = figure_top_depenses(st.session_state.data_version, filtres_actifs, df_filtered)
+        if fig_top is not None:
             st.plotly_chart(fig_top, use_container_width=True)
         else:
             st.info("Aucune dépense pour la période sélectionnée")
@@ -683,7 +1560,7 @@ with tab1:
     # Dernières opérations
     st.markdown("#### 🕒 Dernières Opérations")
     if not df_filtered.empty:
-        recent_ops = df_filtered.sort_values('Date', ascending=False).head(10)
+        recent_ops = colonnes_en_euros(df_filtered.sort_values('Date', ascending=False).head(10))
         
         for idx, row in recent_ops.iterrows():
             with st.container():
@@ -709,52 +1586,57 @@ with tab1:
         st.info("Aucune opération pour la période sélectionnée")
 
 # ========== TAB 2 : HISTORIQUE LIVES ==========
-with tab2:
+if onglet == ONGLETS[1]:
     st.markdown("### 🎬 Historique des Lives")
     
     if not df.empty:
-        lives_ids = df[df['Live_ID'].notna()]['Live_ID'].unique()
+        lives = resume_lives(st.session_state.data_version, df)
         
-        if len(lives_ids) > 0:
-            st.info(f"📊 {len(lives_ids)} live(s) enregistré(s)")
+        if len(lives) > 0:
+            st.info(f"📊 {len(lives)} live(s) enregistré(s)")
             
-            for live_id in sorted(lives_ids, reverse=True):
-                metriques_live = calculer_metriques_live(df, live_id)
-                
-                if metriques_live:
-                    with st.expander(f"🎬 {live_id} - {metriques_live['date'].strftime('%d/%m/%Y')}", expanded=False):
-                        col_l1, col_l2, col_l3 = st.columns(3)
-                        
-                        with col_l1:
-                            st.metric("💰 Gain Brut", f"{metriques_live['gain_brut']:.2f} €")
-                        
-                        with col_l2:
-                            st.metric("🛒 Dépense Stock", f"{metriques_live['depense_stock']:.2f} €")
-                        
-                        with col_l3:
-                            delta_color = "normal" if metriques_live['benefice'] > 0 else "inverse"
-                            st.metric(
-                                "💎 Bénéfice", 
-                                f"{metriques_live['benefice']:.2f} €",
-                                delta="Positif" if metriques_live['benefice'] > 0 else "Négatif",
-                                delta_color=delta_color
-                            )
-                        
-                        st.markdown("**📋 Détails des opérations :**")
-                        live_operations = df[df['Live_ID'] == live_id].sort_values('Date')
-                        
-                        for _, op in live_operations.iterrows():
-                            if op['Montant_Gain'] > 0:
-                                st.success(f"✅ +{op['Montant_Gain']:.2f} € - {op['Description']}")
-                            elif op['Montant_Depense'] > 0:
-                                st.error(f"❌ -{op['Montant_Depense']:.2f} € - {op['Description']}")
+            # Pagination : seuls les lives de la page courante sont rendus
+            lives_page, page, nb_pages = paginer(lives, "page_lives", LIVES_PAR_PAGE)
+            
+            operations_page = colonnes_en_euros(df[df['Live_ID'].isin(lives_page.index)].sort_values('Date'))
+            operations_par_live = dict(tuple(operations_page.groupby('Live_ID')))
+            
+            for live_id, metriques_live in lives_page.iterrows():
+                with st.expander(f"🎬 {live_id} - {metriques_live['date'].strftime('%d/%m/%Y')} ({metriques_live['nb_operations']} op.)", expanded=False):
+                    col_l1, col_l2, col_l3 = st.columns(3)
+                    
+                    with col_l1:
+                        st.metric("💰 Gain Brut", f"{metriques_live['gain_brut']:.2f} €")
+                    
+                    with col_l2:
+                        st.metric("🛒 Dépense Stock", f"{metriques_live['depense_stock']:.2f} €")
+                    
+                    with col_l3:
+                        delta_color = "normal" if metriques_live['benefice'] > 0 else "inverse"
+                        st.metric(
+                            "💎 Bénéfice", 
+                            f"{metriques_live['benefice']:.2f} €",
+                            delta="Positif" if metriques_live['benefice'] > 0 else "Négatif",
+                            delta_color=delta_color
+                        )
+                    
+                    st.markdown("**📋 Détails des opérations :**")
+                    
+                    for _, op in operations_par_live[live_id].iterrows():
+                        if op['Montant_Gain'] > 0:
+                            st.success(f"✅ +{op['Montant_Gain']:.2f} € - {op['Description']}")
+                        elif op['Montant_Depense'] > 0:
+                            st.error(f"❌ -{op['Montant_Depense']:.2f} € - {op['Description']}")
+            
+            if nb_pages > 1:
+                st.caption(f"Page {page} / {nb_pages}")
         else:
             st.info("Aucun live enregistré pour le moment")
     else:
         st.info("Aucune donnée disponible")
 
 # ========== TAB 3 : REMBOURSEMENTS JULIE ==========
-with tab3:
+if onglet == ONGLETS[2]:
     st.markdown("### 💰 Gestion des Remboursements - Julie")
     
     col1, col2, col3 = st.columns(3)
@@ -774,76 +1656,81 @@ with tab3:
     
     st.divider()
     
-    gains_a_rembourser = df[(df['Montant_Gain'] > 0) & (df['Statut_Remb_Julie'] != 'Payé')].copy()
+    gains_en_attente = df[(df['Montant_Gain'] > 0) & (df['Statut_Remb_Julie'] != 'Payé')]
+    gains_a_rembourser = colonnes_en_euros(gains_en_attente)
     
     if not gains_a_rembourser.empty:
-        st.markdown(f"### 💸 Gains à Rembourser ({len(gains_a_rembourser)})")
+        # Valeurs dérivées calculées en une fois pour toute la liste
+        gains_a_rembourser['Part_Julie'] = gains_a_rembourser['Montant_Gain'] / 2
+        gains_a_rembourser['Reste'] = gains_a_rembourser['Part_Julie'] - gains_a_rembourser['Montant_Rembourse_Julie']
+        gains_a_rembourser['Progression'] = (
+            gains_a_rembourser['Montant_Rembourse_Julie'] / gains_a_rembourser['Part_Julie'] * 100
+        )
         
-        for idx, row in gains_a_rembourser.iterrows():
-            part_julie = row['Montant_Gain'] / 2
-            deja_rembourse = row['Montant_Rembourse_Julie']
-            reste_a_rembourser = part_julie - deja_rembourse
-            progression_gain = (deja_rembourse / part_julie * 100) if part_julie > 0 else 0
+        # Paiement groupé : un seul montant réparti sur plusieurs gains, en une seule écriture
+        st.markdown("### 💳 Remboursement Groupé")
+        total_reste = float(gains_a_rembourser['Reste'].clip(lower=0).sum())
+        
+        if total_reste > 0:
+            col_fifo1, col_fifo2, col_fifo3 = st.columns([2, 2, 1])
             
-            with st.expander(
-                f"💰 {part_julie:.2f} € - {row['Description']} (Reste: {reste_a_rembourser:.2f} €)",
-                expanded=False
-            ):
-                col_info1, col_info2 = st.columns(2)
-                
-                with col_info1:
-                    st.write(f"📅 **Date:** {row['Date'].strftime('%d/%m/%Y')}")
-                    st.write(f"🏷️ **Type:** {row['Type']}")
-                    st.write(f"💵 **Gain total:** {row['Montant_Gain']:.2f} €")
-                    if pd.notna(row['Live_ID']):
-                        st.write(f"🎬 **Live:** {row['Live_ID']}")
-                
-                with col_info2:
-                    st.write(f"👤 **Part Julie (50%):** {part_julie:.2f} €")
-                    st.write(f"✅ **Déjà remboursé:** {deja_rembourse:.2f} €")
-                    st.write(f"⏳ **Reste:** {reste_a_rembourser:.2f} €")
-                    st.progress(progression_gain / 100)
-                
-                if pd.notna(row['Notes']) and row['Notes']:
-                    st.info(f"📌 {row['Notes']}")
-                
-                st.markdown("#### 💳 Rembourser")
-                
-                col_form1, col_form2 = st.columns([3, 1])
-                
-                with col_form1:
-                    montant_remb = st.number_input(
-                        "Montant à rembourser (€)",
-                        min_value=0.01,
-                        max_value=float(reste_a_rembourser),
-                        value=float(reste_a_rembourser),
-                        step=0.01,
-                        key=f"remb_{idx}"
-                    )
-                
-                with col_form2:
-                    if st.button("💸 Rembourser", key=f"btn_remb_{idx}", use_container_width=True):
-                        nouveau_total_remb = deja_rembourse + montant_remb
-                        st.session_state.data.at[idx, 'Montant_Rembourse_Julie'] = nouveau_total_remb
-                        
-                        if nouveau_total_remb >= part_julie:
-                            st.session_state.data.at[idx, 'Statut_Remb_Julie'] = 'Payé'
-                            st.session_state.data.at[idx, 'Date_Remb_Complete_Julie'] = datetime.now()
-                        
-                        if save_data(st.session_state.data):
-                            st.success(f"✅ {montant_remb:.2f} € remboursé à Julie !")
-                            st.rerun()
+            with col_fifo1:
+                montant_groupe = st.number_input(
+                    "Montant versé à Julie (€)",
+                    min_value=0.01,
+                    max_value=total_reste,
+                    value=total_reste,
+                    step=0.01
+                )
+            
+            with col_fifo2:
+                ordre_fifo = st.selectbox("Répartition", list(ORDRES_FIFO), key="remb_groupe_ordre")
+            
+            updates_fifo = allouer_remboursement_fifo(gains_en_attente, montant_groupe, ordre_fifo)
+            nb_soldes = sum('Statut_Remb_Julie' in changes for changes in updates_fifo.values())
+            
+            with col_fifo3:
+                st.write("")
+                if st.button("💸 Répartir", key="btn_remb_groupe", use_container_width=True, type="primary"):
+                    if modifier_operations(updates_fifo):
+                        st.success(f"✅ {montant_groupe:.2f} € répartis sur {len(updates_fifo)} gain(s) !")
+                        st.rerun()
+            
+            st.caption(f"{len(updates_fifo)} gain(s) concerné(s), dont {nb_soldes} entièrement remboursé(s)")
+        
+        st.divider()
+        
+        st.markdown(f"### 💸 Gains à Rembourser ({len(gains_a_rembourser)} - reste {gains_a_rembourser['Reste'].sum():.2f} €)")
+        
+        page_gains = filtrer_trier_paginer(gains_a_rembourser, "remb_julie", {
+            "📅 Plus ancien": ('Date', True),
+            "📅 Plus récent": ('Date', False),
+            "⏳ Reste décroissant": ('Reste', False),
+            "⏳ Reste croissant": ('Reste', True)
+        })
+        
+        for op_id in page_gains['ID_Operation']:
+            carte_remboursement(op_id)
     else:
         st.success("🎉 Tous les gains ont été remboursés à Julie !")
     
     st.divider()
     
     st.markdown("### 📜 Historique des Gains Remboursés")
-    gains_rembourses = df[(df['Montant_Gain'] > 0) & (df['Statut_Remb_Julie'] == 'Payé')].sort_values('Date_Remb_Complete_Julie', ascending=False)
+    gains_rembourses = colonnes_en_euros(df[(df['Montant_Gain'] > 0) & (df['Statut_Remb_Julie'] == 'Payé')])
     
     if not gains_rembourses.empty:
-        for _, row in gains_rembourses.iterrows():
-            part_julie = row['Montant_Gain'] / 2
+        gains_rembourses['Part_Julie'] = gains_rembourses['Montant_Gain'] / 2
+        st.caption(f"💰 {gains_rembourses['Part_Julie'].sum():.2f} € remboursés sur {len(gains_rembourses)} gain(s)")
+        
+        page_rembourses = filtrer_trier_paginer(gains_rembourses, "hist_julie", {
+            "✅ Remboursé récemment": ('Date_Remb_Complete_Julie', False),
+            "✅ Remboursé anciennement": ('Date_Remb_Complete_Julie', True),
+            "💰 Montant décroissant": ('Part_Julie', False)
+        })
+        
+        for _, row in page_rembourses.iterrows():
+            part_julie = row['Part_Julie']
             col_h1, col_h2, col_h3, col_h4 = st.columns([2, 3, 2, 2])
             
             with col_h1:
@@ -862,7 +1749,7 @@ with tab3:
         st.info("Aucun remboursement complet pour le moment")
 
 # ========== TAB 4 : MATHÉO ==========
-with tab4:
+if onglet == ONGLETS[3]:
     st.markdown("### 👨‍💻 Tableau de Bord Mathéo")
     
     col1, col2, col3 = st.columns(3)
@@ -899,24 +1786,9 @@ with tab4:
     if not df.empty:
         st.markdown("### 📈 Évolution de Votre Argent Disponible")
         
-        gains_payes = df[(df['Montant_Gain'] > 0) & (df['Statut_Remb_Julie'] == 'Payé')].copy()
+        fig_matheo = figure_argent_matheo(st.session_state.data_version, df)
         
-        if not gains_payes.empty:
-            gains_payes = gains_payes.sort_values('Date_Remb_Complete_Julie')
-            gains_payes['Part_Matheo_Cumulative'] = (gains_payes['Montant_Gain'] / 2).cumsum()
-            
-            fig_matheo = px.line(
-                gains_payes,
-                x='Date_Remb_Complete_Julie',
-                y='Part_Matheo_Cumulative',
-                title="",
-                labels={
-                    'Date_Remb_Complete_Julie': 'Date',
-                    'Part_Matheo_Cumulative': 'Argent Disponible (€)'
-                }
-            )
-            fig_matheo.update_traces(line_color='#3b82f6', line_width=3)
-            fig_matheo.update_layout(hovermode='x unified')
+        if fig_matheo is not None:
             st.plotly_chart(fig_matheo, use_container_width=True)
         else:
             st.info("Pas encore de remboursements complets")
@@ -925,11 +1797,19 @@ with tab4:
     
     st.markdown("### 💰 Détail de Votre Argent Disponible")
     
-    gains_disponibles = df[(df['Montant_Gain'] > 0) & (df['Statut_Remb_Julie'] == 'Payé')].sort_values('Date_Remb_Complete_Julie', ascending=False)
+    gains_disponibles = colonnes_en_euros(df[(df['Montant_Gain'] > 0) & (df['Statut_Remb_Julie'] == 'Payé')])
     
     if not gains_disponibles.empty:
-        for _, row in gains_disponibles.iterrows():
-            part_matheo = row['Montant_Gain'] / 2
+        gains_disponibles['Part_Matheo'] = gains_disponibles['Montant_Gain'] / 2
+        
+        page_disponibles = filtrer_trier_paginer(gains_disponibles, "dispo_matheo", {
+            "✅ Débloqué récemment": ('Date_Remb_Complete_Julie', False),
+            "✅ Débloqué anciennement": ('Date_Remb_Complete_Julie', True),
+            "💰 Montant décroissant": ('Part_Matheo', False)
+        })
+        
+        for _, row in page_disponibles.iterrows():
+            part_matheo = row['Part_Matheo']
             
             col_d1, col_d2, col_d3, col_d4 = st.columns([2, 3, 2, 2])
             
@@ -950,7 +1830,7 @@ with tab4:
         st.info("Remboursez Julie pour débloquer votre argent !")
 
 # ========== TAB 5 : OBJECTIFS ==========
-with tab5:
+if onglet == ONGLETS[4]:
     st.markdown("### 🎯 Objectifs de Chiffre d'Affaires")
     
     paliers = [
@@ -1049,9 +1929,54 @@ with tab5:
                 st.write(f"{reste_palier:.0f} €")
 
 # ========== TAB 6 : DONNÉES ==========
-with tab6:
+if onglet == ONGLETS[5]:
     st.markdown("### 📋 Gestion des Données")
     
+    # IMPORT EN LOT D'UN EXPORT WHATNOT
+    with st.expander("📥 Importer un export Whatnot (CSV)"):
+        fichier_whatnot = st.file_uploader("Export des ventes ou des versements", type=['csv'], key="import_whatnot")
+        live_import = st.text_input(
+            "🎬 Live_ID pour tout le fichier",
+            help="Sinon : colonne du live de l'export, ou un live par jour de vente",
+            key="import_whatnot_live"
+        )
+        
+        if fichier_whatnot is not None:
+            try:
+                ventes, nb_ignorees = lire_import_whatnot(fichier_whatnot.getvalue(), live_import)
+            except ValueError as e:
+                st.error(f"❌ {e}")
+            else:
+                doublons_import = obtenir_index_doublons().doublons(ventes)
+                nouvelles_ventes = ventes[~doublons_import]
+                st.caption(
+                    f"{len(nouvelles_ventes)} vente(s) à importer ({nouvelles_ventes['Montant_Gain'].sum() / 100:.2f} €), "
+                    f"{int(doublons_import.sum())} doublon(s) et {nb_ignorees} ligne(s) ignorée(s)"
+                )
+                st.dataframe(
+                    colonnes_en_euros(ventes.assign(Doublon=doublons_import))[
+                        ['Date', 'Description', 'Montant_Gain', 'Live_ID', 'Doublon']
+                    ].head(LIGNES_PAR_PAGE),
+                    column_config={
+                        "Date": st.column_config.DateColumn("Date", format="DD/MM/YYYY"),
+                        "Montant_Gain": st.column_config.NumberColumn("Gain", format="%.2f €"),
+                        "Doublon": st.column_config.CheckboxColumn("⚠️ Doublon")
+                    },
+                    use_container_width=True,
+                    hide_index=True
+                )
+                
+                if st.button(
+                    f"💾 Importer {len(nouvelles_ventes)} vente(s)",
+                    disabled=nouvelles_ventes.empty,
+                    use_container_width=True,
+                    type="primary"
+                ):
+                    # Un seul ajout groupé pour tout le fichier
+                    if ajouter_operations(nouvelles_ventes.reset_index(drop=True)):
+                        st.success(f"✅ {len(nouvelles_ventes)} vente(s) importée(s) !")
+                        st.rerun()
+    
     col_del1, col_del2 = st.columns([3, 1])
     
     with col_del1:
@@ -1068,24 +1993,26 @@ with tab6:
             st.rerun()
     
     if not df.empty:
+        # Vue en euros, sans les colonnes internes
+        df_affichage = colonnes_en_euros(df[[col for col in df.columns if not col.startswith('_')]])
+        
         if st.session_state.delete_mode:
+            df_by_id = df_affichage.set_index('ID_Operation')
             selected_rows = st.multiselect(
                 "Sélectionnez les opérations à supprimer",
-                options=df.index.tolist(),
-                format_func=lambda x: f"{df.loc[x, 'Date'].strftime('%d/%m/%Y')} - {df.loc[x, 'Description']} - {df.loc[x, 'Montant_Gain'] if df.loc[x, 'Montant_Gain'] > 0 else -df.loc[x, 'Montant_Depense']:.2f} €"
+                options=df['ID_Operation'].tolist(),
+                format_func=lambda x: f"{df_by_id.loc[x, 'Date'].strftime('%d/%m/%Y')} - {df_by_id.loc[x, 'Description']} - {df_by_id.loc[x, 'Montant_Gain'] if df_by_id.loc[x, 'Montant_Gain'] > 0 else -df_by_id.loc[x, 'Montant_Depense']:.2f} €"
             )
             
             if selected_rows:
                 if st.button("🗑️ Supprimer les lignes sélectionnées", type="primary"):
-                    st.session_state.data = st.session_state.data.drop(selected_rows).reset_index(drop=True)
-                    
-                    if save_data(st.session_state.data):
+                    if supprimer_operations(selected_rows):
                         st.success(f"✅ {len(selected_rows)} ligne(s) supprimée(s)")
                         st.session_state.delete_mode = False
                         st.rerun()
         
         st.dataframe(
-            df,
+            df_affichage,
             column_config={
                 "Date": st.column_config.DateColumn("Date", format="DD/MM/YYYY"),
                 "Montant_Gain": st.column_config.NumberColumn("Gain", format="%.2f €"),
@@ -1099,35 +2026,71 @@ with tab6:
         
         # Exports
         st.markdown("### 📥 Exports")
-        col_exp1, col_exp2, col_exp3 = st.columns(3)
+        col_exp1, col_exp2, col_exp3, col_exp4 = st.columns(4)
+        version_export = st.session_state.data_version
         
         with col_exp1:
-            csv = df.to_csv(index=False).encode('utf-8')
-            st.download_button("📥 Télécharger CSV", csv, "whatnot_data.csv", "text/csv", key='download-csv')
+            st.download_button(
+                "📥 Télécharger CSV",
+                lambda: export_csv(version_export, df_affichage),
+                "whatnot_data.csv",
+                "text/csv",
+                key='download-csv'
+            )
         
         with col_exp2:
             # Export Excel
-            try:
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    df.to_excel(writer, index=False, sheet_name='Données')
-                    
-                    # Feuille métriques
-                    metriques_df = pd.DataFrame([metriques])
-                    metriques_df.to_excel(writer, index=False, sheet_name='Métriques')
-                
+            if importlib.util.find_spec('openpyxl') is None:
+                st.warning("Export Excel non disponible : openpyxl n'est pas installé")
+            else:
                 st.download_button(
                     "📥 Télécharger Excel",
-                    output.getvalue(),
+                    lambda: export_excel(version_export, df_affichage, metriques),
                     "whatnot_data.xlsx",
                     "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     key='download-excel'
                 )
-            except Exception as e:
-                st.warning(f"Export Excel non disponible : {e}")
         
         with col_exp3:
-            st.info("📄 Export PDF bientôt disponible")
+            st.download_button(
+                "📥 Télécharger Parquet",
+                lambda: export_parquet(version_export, df_affichage),
+                "whatnot_data.parquet",
+                "application/vnd.apache.parquet",
+                key='download-parquet'
+            )
+        
+        with col_exp4:
+            # Rapport PDF de la période filtrée, une génération par (filtres, version des données)
+            cle_rapport = (*filtres_actifs, st.session_state.data_version)
+            etat_rapport = travaux_rapports.etat(cle_rapport)
+            titre_rapport = f"Rapport Whatnot - {periode}" + (f" - {live_filtre}" if live_filtre != "Tous" else "")
+            
+            if importlib.util.find_spec('matplotlib') is None:
+                st.warning("Export PDF non disponible : matplotlib n'est pas installé")
+            elif etat_rapport is None:
+                if st.button("📄 Générer le rapport PDF", key='generer-pdf'):
+                    # Copie figée : la session modifie ses données en place pendant la génération
+                    travaux_rapports.soumettre(cle_rapport, titre_rapport, df_filtered.copy(), metriques_filtered)
+                    st.rerun()
+            elif not etat_rapport:
+                suivi_rapport_pdf(cle_rapport)
+            else:
+                try:
+                    pdf = travaux_rapports.resultat(cle_rapport)
+                except Exception as e:
+                    st.error(f"❌ Erreur lors de la génération du rapport : {e}")
+                    if st.button("🔄 Relancer le rapport PDF", key='relancer-pdf'):
+                        travaux_rapports.soumettre(cle_rapport, titre_rapport, df_filtered.copy(), metriques_filtered)
+                        st.rerun()
+                else:
+                    st.download_button(
+                        "📥 Télécharger le rapport PDF",
+                        pdf,
+                        f"rapport_whatnot_{cle_rapport[1]}.pdf",
+                        "application/pdf",
+                        key='download-pdf'
+                    )
     else:
         st.info("Aucune donnée à afficher")
 
@@ -0,0 +1,87 @@
+"""Index des opérations pour la détection de doublons, sans dépendance à Streamlit"""
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+import pandas as pd
+
+SEUIL_SIMILARITE = 0.8  # ratio difflib au-delà duquel deux descriptions sont jugées identiques
+
+
+def normaliser_description(texte):
+    """Description comparable : minuscules, sans accents ni ponctuation, espaces réduits"""
+    if not isinstance(texte, str):
+        return ''
+    texte = unicodedata.normalize('NFKD', texte).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', ' ', texte.lower()).strip()
+
+
+def en_centimes(montant):
+    return int(round(float(montant) * 100))
+
+
+def cle_operation(date, description, centimes):
+    """Clé d'une opération : (jour, description normalisée, montant en centimes)"""
+    date = pd.to_datetime(date, errors='coerce')
+    jour = date.strftime('%Y-%m-%d') if pd.notna(date) else ''
+    return jour, normaliser_description(description), int(centimes)
+
+
+def cles_operations(data):
+    """Clés de toutes les lignes du registre en mémoire (montants en centimes), calculées par colonnes"""
+    jours = pd.to_datetime(data['Date'], errors='coerce').dt.strftime('%Y-%m-%d').fillna('')
+    descriptions = data['Description'].astype(object)
+    normalisees = descriptions.map({d: normaliser_description(d) for d in descriptions.unique()})
+    # Une opération n'a qu'un des deux montants renseigné
+    centimes = (data['Montant_Gain'] + data['Montant_Depense']).astype('int64')
+    return list(zip(jours, normalisees, centimes))
+
+
+class IndexDoublons:
+    """Index par hachage {(jour, description, centimes): ID_Operation}, tenu à jour ligne par ligne"""
+
+    def __init__(self, data=None):
+        self.exact = {}
+        self.par_montant = {}  # {(jour, centimes): {description: ids}} pour la recherche approximative
+        if data is not None:
+            self.ajouter(data)
+
+    def __len__(self):
+        return sum(len(ids) for ids in self.exact.values())
+
+    def ajouter(self, data):
+        for cle, op_id in zip(cles_operations(data), data['ID_Operation']):
+            self._ajouter_cle(cle, op_id)
+
+    def retirer(self, data):
+        for cle, op_id in zip(cles_operations(data), data['ID_Operation']):
+            ids = self.exact.get(cle)
+            if ids and op_id in ids:
+                ids.remove(op_id)
+                self.par_montant[(cle[0], cle[2])][cle[1]].remove(op_id)
+
+    def _ajouter_cle(self, cle, op_id):
+        jour, description, centimes = cle
+        self.exact.setdefault(cle, []).append(op_id)
+        self.par_montant.setdefault((jour, centimes), {}).setdefault(description, []).append(op_id)
+
+    def chercher(self, date, description, montant, flou=False):
+        """ID_Operation des opérations identiques (montant en euros) ; en mode flou, la description peut différer légèrement"""
+        return self._chercher_cle(cle_operation(date, description, en_centimes(montant)), flou)
+
+    def _chercher_cle(self, cle, flou):
+        if not flou:
+            return list(self.exact.get(cle, []))
+
+        jour, normalisee, centimes = cle
+        trouves = []
+        for autre, ids in self.par_montant.get((jour, centimes), {}).items():
+            if autre == normalisee or SequenceMatcher(None, autre, normalisee).ratio() >= SEUIL_SIMILARITE:
+                trouves.extend(ids)
+        return trouves
+
+    def doublons(self, data, flou=False):
+        """Masque des lignes de data (format mémoire) déjà présentes dans l'index (imports en lot)"""
+        return pd.Series(
+            [bool(self._chercher_cle(cle, flou)) for cle in cles_operations(data)], index=data.index, dtype=bool
+        )
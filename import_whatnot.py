@@ -0,0 +1,169 @@
+"""Import en lot des exports CSV Whatnot (ventes / versements), sans dépendance à Streamlit
+
+Utilisation en ligne de commande :
+    python import_whatnot.py export.csv [--live LIVE_ID] [--flou] [--simulation]
+"""
+import argparse
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from doublons import IndexDoublons
+from ledger import LocalLedger
+
+TYPE_GAIN_LIVE = "💰 Gain Live"
+COLONNES_MONTANTS = ['Montant_Gain', 'Montant_Depense', 'Montant_Rembourse_Julie']
+
+# En-têtes reconnus (minuscules, sans _ ni -), par ordre de préférence : le CA brut avant le net versé
+ALIAS_COLONNES = {
+    'Date': ['order date', 'sold date', 'date sold', 'created at', 'processed date', 'transaction date', 'payout date', 'date'],
+    'Montant': [
+        'sold price', 'item price', 'price', 'subtotal', 'gross sales', 'gross', 'total',
+        'net earnings', 'net payout', 'payout amount', 'amount', 'prix', 'montant'
+    ],
+    'Live': ['show id', 'livestream id', 'live id', 'stream id', 'show', 'show title', 'livestream', 'livestream title'],
+    'Produit': ['product name', 'item name', 'listing title', 'product', 'item', 'title', 'description'],
+    'Commande': ['order id', 'order numeric id', 'order number', 'transaction id', 'id'],
+}
+
+
+# --- LECTURE DE L'EXPORT ---
+def normaliser_entete(colonne):
+    return ' '.join(str(colonne).lower().replace('_', ' ').replace('-', ' ').split())
+
+
+def trouver_colonnes(colonnes):
+    """{champ: colonne de l'export} pour les champs reconnus"""
+    par_entete = {normaliser_entete(col): col for col in colonnes}
+    return {
+        champ: next(par_entete[alias] for alias in alias_champ if alias in par_entete)
+        for champ, alias_champ in ALIAS_COLONNES.items()
+        if any(alias in par_entete for alias in alias_champ)
+    }
+
+
+def montants_en_centimes(valeurs):
+    """'$1,234.50', '1 234,50 €', '1.234', '12.5'... → centimes (NaN si illisible), sur toute la colonne"""
+    texte = valeurs.astype(str).str.replace(r'[^\d,.\-]', '', regex=True)
+    # Un seul type de séparateur, suivi de groupes de 3 chiffres ('1,234', '1.234.567') : milliers
+    milliers = texte.str.fullmatch(r'-?[1-9]\d{0,2}(?:(?:,\d{3})+|(?:\.\d{3})+)')
+    # Sinon le dernier séparateur est la décimale, l'autre sert aux milliers
+    virgule_decimale = texte.str.rfind(',') > texte.str.rfind('.')
+    texte = pd.Series(
+        np.select(
+            [milliers, virgule_decimale],
+            [
+                texte.str.replace(r'[,.]', '', regex=True),
+                texte.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+            ],
+            texte.str.replace(',', '', regex=False)
+        ),
+        index=valeurs.index
+    )
+    return (pd.to_numeric(texte, errors='coerce') * 100).round()
+
+
+def lire_export_whatnot(source, live_id=None):
+    """Opérations (format mémoire : montants en centimes) d'un export CSV Whatnot.
+
+    Retourne (opérations, nombre de lignes ignorées : montant nul ou illisible, date absente).
+    """
+    export = pd.read_csv(source, sep=None, engine='python', dtype=str, encoding='utf-8-sig')
+    colonnes = trouver_colonnes(export.columns)
+    manquants = [champ for champ in ('Date', 'Montant') if champ not in colonnes]
+    if manquants:
+        raise ValueError(f"Colonnes introuvables dans l'export : {', '.join(manquants)}")
+
+    dates = pd.to_datetime(export[colonnes['Date']], errors='coerce', format='mixed', utc=True).dt.tz_localize(None)
+    centimes = montants_en_centimes(export[colonnes['Montant']])
+    valides = dates.notna() & (centimes > 0)
+    export, dates, centimes = export[valides], dates[valides], centimes[valides].astype('int64')
+
+    # Live : imposé, sinon colonne de l'export, sinon un live par jour de vente
+    if live_id:
+        lives = pd.Series(live_id, index=export.index)
+    elif 'Live' in colonnes:
+        lives = export[colonnes['Live']].fillna('LIVE_' + dates.dt.strftime('%Y%m%d'))
+    else:
+        lives = 'LIVE_' + dates.dt.strftime('%Y%m%d')
+
+    # Le numéro de commande rend chaque vente unique (réimport du même fichier = doublons)
+    if 'Produit' in colonnes:
+        description = export[colonnes['Produit']].fillna('Vente Whatnot')
+    else:
+        description = pd.Series('Vente Whatnot', index=export.index)
+    if 'Commande' in colonnes:
+        commandes = export[colonnes['Commande']]
+        description = ('Whatnot #' + commandes + ' - ' + description).where(commandes.notna(), description)
+
+    operations = pd.DataFrame({
+        'Date': dates,
+        'Type': TYPE_GAIN_LIVE,
+        'Description': description,
+        'Montant_Gain': centimes,
+        'Montant_Depense': 0,
+        'Live_ID': lives,
+        'Montant_Rembourse_Julie': 0,
+        'Statut_Remb_Julie': 'En attente',
+        'Date_Remb_Complete_Julie': pd.NaT,
+        'Année': dates.dt.year.astype(str),
+        'Notes': 'Import Whatnot',
+        'ID_Operation': [f"op_{uuid.uuid4().hex[:12]}" for _ in range(len(export))],
+        'Revision': 0,
+    })
+    return operations.reset_index(drop=True), int((~valides).sum())
+
+
+# --- IMPORT EN LIGNE DE COMMANDE ---
+def depuis_format_feuille(frame):
+    """Registre local (euros, dates texte) → colonnes utiles à l'index des doublons (centimes)"""
+    frame = frame.copy()
+    for col in ('Montant_Gain', 'Montant_Depense'):
+        frame[col] = (pd.to_numeric(frame[col], errors='coerce').fillna(0) * 100).round().astype('int64')
+    return frame
+
+
+def vers_format_feuille(operations):
+    """Opérations importées → format de la feuille et du registre local (euros, dates texte)"""
+    frame = operations.assign(**{col: operations[col] / 100 for col in COLONNES_MONTANTS})
+    frame['Date'] = frame['Date'].dt.strftime('%Y-%m-%d')
+    frame['Date_Remb_Complete_Julie'] = None
+    return frame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importe un export CSV Whatnot dans le registre local")
+    parser.add_argument('fichier', type=Path, help="export CSV des ventes ou des versements Whatnot")
+    parser.add_argument('--live', help="Live_ID appliqué à toutes les ventes du fichier")
+    parser.add_argument('--registre', type=Path, default=Path(__file__).with_name('whatnot_ledger.sqlite'),
+                        help="registre SQLite de l'application (synchronisé avec Google Sheets par l'application)")
+    parser.add_argument('--flou', action='store_true', help="détecte aussi les doublons à description proche")
+    parser.add_argument('--simulation', action='store_true', help="analyse le fichier sans rien enregistrer")
+    args = parser.parse_args(argv)
+
+    operations, nb_ignorees = lire_export_whatnot(args.fichier, args.live)
+    ledger = LocalLedger(args.registre)
+    if not ledger.is_initialized():
+        parser.error("registre local vide : lancez d'abord l'application pour le charger depuis Google Sheets")
+    existantes = ledger.read_frame()
+    if not existantes.empty:
+        doublons = IndexDoublons(depuis_format_feuille(existantes)).doublons(operations, flou=args.flou)
+        operations = operations[~doublons]
+    else:
+        doublons = pd.Series(False, index=operations.index)
+
+    print(f"{len(operations)} vente(s) à importer ({operations['Montant_Gain'].sum() / 100:.2f} €), "
+          f"{int(doublons.sum())} doublon(s) et {nb_ignorees} ligne(s) ignorée(s)")
+    if args.simulation or operations.empty:
+        return 0
+
+    # Un seul ajout groupé, envoyé à la feuille par l'application au prochain cycle de synchronisation
+    ledger.append(vers_format_feuille(operations))
+    print(f"✅ {len(operations)} vente(s) ajoutée(s) au registre {args.registre}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
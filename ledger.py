@@ -0,0 +1,378 @@
+"""Registre local SQLite avec synchronisation différée vers Google Sheets"""
+import json
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+TABLE_OPERATIONS = 'operations'
+COLONNE_ID = 'ID_Operation'
+COLONNE_REVISION = 'Revision'  # incrémentée à chaque modification d'une ligne
+
+
+class StructureFeuille(ValueError):
+    """La feuille n'a pas les colonnes attendues (feuille vierge, colonne retirée...) : réécriture nécessaire"""
+
+
+class ConflitEcriture(Exception):
+    """Opérations modifiées ou supprimées entre-temps par une autre session ou un autre appareil"""
+
+    def __init__(self, ids):
+        super().__init__(f"{len(ids)} opération(s) modifiée(s) entre-temps : {', '.join(map(str, ids))}")
+        self.ids = list(ids)
+
+
+def meme_valeur(a, b):
+    """Compare deux valeurs de cellule (vide = None = NaN, 12 = 12.0 = '12')"""
+    a, b = ('' if v is None or (isinstance(v, float) and v != v) else v for v in (a, b))
+    try:
+        return float(a) == float(b)
+    except (TypeError, ValueError):
+        return str(a) == str(b)
+
+
+def revision(valeur):
+    try:
+        return int(float(valeur))
+    except (TypeError, ValueError):
+        return 0
+
+
+class LocalLedger:
+    """Copie locale de la feuille (format feuille) + file des modifications à envoyer"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.version = 0
+        self.last_sync = None
+        self.last_error = None
+        self.last_conflict = None
+        self._data_version = None
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, payload TEXT, created REAL NOT NULL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+
+    # --- LECTURE ---
+    def is_initialized(self):
+        """Indique si le registre a déjà été alimenté depuis la feuille"""
+        return self.get_meta('initialized') == '1'
+
+    def get_meta(self, key, default=None):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+            self._db.commit()
+
+    def columns(self):
+        with self._lock:
+            rows = self._db.execute(f'PRAGMA table_info("{TABLE_OPERATIONS}")').fetchall()
+        return [row[1] for row in rows]
+
+    def read_frame(self):
+        """Retourne toutes les opérations locales, dans l'ordre de la feuille"""
+        with self._lock:
+            if not self.columns():
+                return pd.DataFrame()
+            return pd.read_sql(f'SELECT * FROM "{TABLE_OPERATIONS}" ORDER BY rowid', self._db)
+
+    def pending(self):
+        """Liste des modifications pas encore envoyées : [(id, kind, payload)]"""
+        with self._lock:
+            rows = self._db.execute("SELECT id, kind, payload FROM outbox ORDER BY id").fetchall()
+        return [(op_id, kind, json.loads(payload) if payload else None) for op_id, kind, payload in rows]
+
+    def snapshot(self):
+        """Retourne (opérations locales, dernier id de la file) lus de façon atomique"""
+        with self._lock:
+            last_id = self._db.execute("SELECT COALESCE(MAX(id), 0) FROM outbox").fetchone()[0]
+            return self.read_frame(), last_id
+
+    def rows(self, ids, columns):
+        """Valeurs actuelles {ID_Operation: {colonne: valeur}} des lignes demandées (absentes si supprimées)"""
+        with self._lock:
+            selection = ', '.join(f'"{col}"' for col in [COLONNE_ID, *columns])
+            placeholders = ', '.join('?' * len(ids))
+            rows = self._db.execute(
+                f'SELECT {selection} FROM "{TABLE_OPERATIONS}" WHERE "{COLONNE_ID}" IN ({placeholders})', list(ids)
+            ).fetchall()
+        return {row[0]: dict(zip(columns, row[1:])) for row in rows}
+
+    def pending_count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def check_external_changes(self):
+        """Nouvelle version si un autre processus a écrit dans le registre (ex. import en ligne de commande)"""
+        with self._lock:
+            data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+            if self._data_version is not None and data_version != self._data_version:
+                self.version += 1
+            self._data_version = data_version
+
+    # --- ÉCRITURE LOCALE ---
+    def _enqueue(self, kind, payload=None):
+        self._db.execute(
+            "INSERT INTO outbox (kind, payload, created) VALUES (?, ?, ?)",
+            (kind, json.dumps(payload) if payload is not None else None, time.time())
+        )
+
+    def _check_initialized(self):
+        # Sans copie initiale de la feuille, une réécriture effacerait les données distantes
+        if not self.is_initialized():
+            raise RuntimeError("Registre local pas encore chargé depuis Google Sheets")
+
+    def _write_table(self, frame):
+        frame.to_sql(TABLE_OPERATIONS, self._db, if_exists='replace', index=False)
+
+    def replace(self, frame, sync=True):
+        """Remplace tout le registre (changement de structure) et programme une réécriture de la feuille"""
+        with self._lock:
+            self._check_initialized()
+            self._write_table(frame)
+            if sync:
+                self._enqueue('rewrite')
+            self._db.commit()
+            self.version += 1
+
+    def append(self, rows):
+        """Ajoute des lignes localement et programme leur envoi en fin de feuille"""
+        with self._lock:
+            self._check_initialized()
+            columns = self.columns()
+            if columns and all(col in columns for col in rows.columns):
+                rows.to_sql(TABLE_OPERATIONS, self._db, if_exists='append', index=False)
+                self._enqueue('append', rows.to_dict(orient='records'))
+                self._db.commit()
+                self.version += 1
+            else:
+                self.replace(pd.concat([self.read_frame(), rows], ignore_index=True))
+
+    def patch(self, updates, expected=None):
+        """Modifie des cellules {ID_Operation: {colonne: valeur}} et programme leur envoi.
+
+        expected = {ID_Operation: {colonne: valeur lue}} (dont Revision) : contrôle optimiste.
+        Si une ligne a changé depuis sa lecture, la modification passe quand même tant que
+        les colonnes modifiées n'ont pas été touchées (fusion) ; sinon ConflitEcriture est levée
+        et rien n'est écrit. Retourne les nouvelles révisions {ID_Operation: révision}.
+        """
+        with self._lock:
+            self._check_initialized()
+            columns = self.columns()
+            new_columns = [
+                col for col in {COLONNE_REVISION, *(col for changes in updates.values() for col in changes)}
+                if col not in columns
+            ]
+            for col in new_columns:
+                self._db.execute(f'ALTER TABLE "{TABLE_OPERATIONS}" ADD COLUMN "{col}"')
+                columns.append(col)
+
+            current = self.rows(list(updates), columns)
+            conflicts = [
+                op_id for op_id, values in (expected or {}).items()
+                if op_id in updates and not self._compatible(current.get(op_id), values, updates[op_id])
+            ]
+            if conflicts:
+                raise ConflitEcriture(conflicts)
+
+            written, before = {}, {}
+            for op_id, changes in updates.items():
+                if op_id not in current:
+                    continue
+                # Valeurs remplacées : la feuille fusionne si un autre appareil n'y a pas touché
+                before[op_id] = {col: current[op_id].get(col) for col in [*changes, COLONNE_REVISION]}
+                changes = {**changes, COLONNE_REVISION: revision(current[op_id][COLONNE_REVISION]) + 1}
+                assignments = ', '.join(f'"{col}" = ?' for col in changes)
+                self._db.execute(
+                    f'UPDATE "{TABLE_OPERATIONS}" SET {assignments} WHERE "{COLONNE_ID}" = ?',
+                    (*changes.values(), op_id)
+                )
+                written[op_id] = changes
+            self._enqueue('patch', {'valeurs': written, 'avant': before})
+            if new_columns:
+                # Changement de structure : la feuille doit recevoir les nouvelles colonnes
+                self._enqueue('rewrite')
+            self._db.commit()
+            self.version += 1
+            return {op_id: changes[COLONNE_REVISION] for op_id, changes in written.items()}
+
+    @staticmethod
+    def _compatible(current, expected, changes):
+        if current is None:
+            return False
+        if revision(current[COLONNE_REVISION]) == revision(expected.get(COLONNE_REVISION)):
+            return True
+        # Ligne modifiée ailleurs : fusion si les colonnes modifiées ici n'ont pas bougé
+        return all(meme_valeur(current.get(col), expected.get(col)) for col in changes)
+
+    def delete(self, ids):
+        """Supprime des opérations par ID et programme leur suppression dans la feuille"""
+        with self._lock:
+            self._check_initialized()
+            placeholders = ', '.join('?' * len(ids))
+            self._db.execute(f'DELETE FROM "{TABLE_OPERATIONS}" WHERE "{COLONNE_ID}" IN ({placeholders})', list(ids))
+            self._enqueue('delete', list(ids))
+            self._db.commit()
+            self.version += 1
+
+    # --- SYNCHRONISATION ---
+    def acknowledge(self, last_id):
+        """Retire de la file les modifications envoyées jusqu'à last_id inclus"""
+        with self._lock:
+            self._db.execute("DELETE FROM outbox WHERE id <= ?", (last_id,))
+            self._db.commit()
+
+    def replace_from_remote(self, frame, expected_version, needs_rewrite=False):
+        """Remplace le registre par la feuille si aucune écriture locale n'a eu lieu entre-temps"""
+        with self._lock:
+            if self.version != expected_version or self.pending_count():
+                return False
+            self._write_table(frame)
+            if needs_rewrite:
+                self._enqueue('rewrite')
+            self.set_meta('initialized', 1)
+            self.version += 1
+            return True
+
+
+class SyncWorker(threading.Thread):
+    """Envoie les modifications en lot vers la feuille et récupère les modifications distantes"""
+
+    def __init__(self, ledger, push_append, push_patch, push_delete, push_rewrite, pull, probe=None, interval=15):
+        """pull() doit retourner (DataFrame au format feuille, besoin de réécrire la feuille).
+
+        push_patch(updates, revisions, attendues) lève ConflitEcriture pour les lignes dont la révision
+        dans la feuille n'est plus celle attendue (modifiées par un autre appareil), sauf si les
+        cellules visées ont encore les valeurs attendues {ID_Operation: {colonne: valeur}} (fusion).
+
+        push_append, push_patch et push_delete lèvent StructureFeuille si l'en-tête de la feuille
+        ne convient pas : la feuille est alors réécrite. Les autres erreurs laissent la file en place.
+
+        push_append ne doit pas dupliquer une ligne dont l'ID_Operation est déjà dans la feuille
+        (envoi interrompu avant l'acquittement, ex. redémarrage).
+
+        probe() retourne un jeton peu coûteux (ex. date de modification) qui change
+        avec la feuille : tant qu'il est identique, la feuille n'est pas relue.
+        """
+        super().__init__(name="whatnot-sync", daemon=True)
+        self.ledger = ledger
+        self.push_append = push_append
+        self.push_patch = push_patch
+        self.push_delete = push_delete
+        self.push_rewrite = push_rewrite
+        self.pull = pull
+        self.probe = probe
+        self.interval = interval
+        self._wake = threading.Event()
+        self._synced = threading.Event()
+        self._force_pull = False
+        self._remote_token = None
+        self._appended = set()  # ID_Operation déjà ajoutés à la feuille, pas encore acquittés
+
+    def notify(self):
+        """Demande une synchronisation immédiate"""
+        self._wake.set()
+
+    def refresh(self, timeout=10):
+        """Force une relecture de la feuille et attend la fin du cycle (True si terminé à temps)"""
+        self._synced.clear()
+        self._force_pull = True
+        self.notify()
+        return self._synced.wait(timeout)
+
+    def run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.sync_once()
+                self.ledger.last_sync = time.time()
+                self.ledger.last_error = None
+            except Exception as e:
+                self.ledger.last_error = str(e)
+            self._synced.set()
+
+    def sync_once(self):
+        self.ledger.check_external_changes()
+        ops = self.ledger.pending()
+        if ops:
+            self.push(ops)
+            # Nos propres écritures modifient le jeton : une relecture complète suivra
+            self._remote_token = None
+            return
+
+        force, self._force_pull = self._force_pull, False
+        token = self.probe() if self.probe else None
+        if not force and token is not None and token == self._remote_token:
+            return
+
+        version = self.ledger.version
+        remote, needs_rewrite = self.pull()
+        local = self.ledger.read_frame()
+        if needs_rewrite or not remote.astype(str).equals(local.astype(str)):
+            self.ledger.replace_from_remote(remote, version, needs_rewrite)
+        self._remote_token = token
+
+    def push(self, ops):
+        """Regroupe les modifications en attente en un minimum d'appels à l'API"""
+        if any(kind == 'rewrite' for _, kind, _ in ops):
+            self.rewrite()
+            return
+
+        deleted = {op_id for _, kind, payload in ops if kind == 'delete' for op_id in payload}
+        records = [
+            record for _, kind, payload in ops if kind == 'append'
+            for record in payload if record.get(COLONNE_ID) not in deleted | self._appended
+        ]
+        updates, revisions, attendues = {}, {}, {}
+        for _, kind, payload in ops:
+            if kind == 'patch':
+                # File écrite avant l'ajout des valeurs remplacées : {ID_Operation: modifications}
+                valeurs, avant = (payload['valeurs'], payload['avant']) if 'valeurs' in payload else (payload, {})
+                for op_id, changes in valeurs.items():
+                    if op_id in deleted:
+                        continue
+                    # Révision et cellules attendues dans la feuille : celles d'avant la première modification en attente
+                    attendue = revision(changes[COLONNE_REVISION]) - 1 if COLONNE_REVISION in changes else None
+                    revisions.setdefault(op_id, attendue)
+                    for col, valeur in avant.get(op_id, {}).items():
+                        attendues.setdefault(op_id, {}).setdefault(col, valeur)
+                    updates.setdefault(op_id, {}).update(changes)
+
+        try:
+            if records:
+                self.push_append(pd.DataFrame(records))
+                # Un nouvel essai après l'échec d'une étape suivante ne renvoie pas ces lignes
+                self._appended.update(record.get(COLONNE_ID) for record in records)
+            if deleted:
+                self.push_delete(sorted(deleted))
+            self.ledger.last_conflict = None
+            if updates:
+                self.push_patch(updates, revisions, attendues)
+        except ConflitEcriture as e:
+            # La version de la feuille l'emporte pour ces lignes : elle remplace le registre au prochain cycle
+            self.ledger.last_conflict = str(e)
+        except StructureFeuille:
+            # En-tête incomplet : la feuille est réécrite à partir du registre local
+            self.rewrite()
+            return
+        # Autres erreurs (réseau, quota...) : propagées, la file reste en place et sera renvoyée au
+        # prochain cycle ; une réécriture écraserait les lignes ajoutées depuis par un autre appareil
+        self.ledger.acknowledge(ops[-1][0])
+        self._appended.clear()
+
+    def rewrite(self):
+        """Réécrit toute la feuille ; le registre contient déjà toutes les modifications en attente"""
+        frame, last_id = self.ledger.snapshot()
+        self.push_rewrite(frame)
+        self.ledger.acknowledge(last_id)
+        self._appended.clear()
@@ -0,0 +1,373 @@
+"""OCR des tickets de caisse, sans dépendance à Streamlit (utilisable dans des threads de fond)"""
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytesseract
+from PIL import Image, ImageOps
+
+
+# Tesseract (OpenMP) prend tous les cœurs par défaut, alors que analyser_tickets lance déjà un sous-processus
+# par cœur. pytesseract ne transmet que l'environnement du processus : la limite est posée une seule fois,
+# à l'import, et ne concerne que les programmes OpenMP (une valeur déjà définie est respectée).
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+# Réglages OCR : ils font partie de la clé du cache, tout changement invalide les résultats
+REGLAGES_OCR = {
+    'lang': 'fra',
+    'dpi': 300,                  # résolution visée pour Tesseract
+    'largeur_ticket_mm': 80,     # largeur d'un ticket de caisse standard
+    'binariser': True,
+    'redresser': False,          # correction d'inclinaison (plus lent)
+    'mode_rapide': True,         # moteur LSTM seul + texte en un bloc
+    'psm': 6,
+    'whitelist_montant': '0123456789,.',
+    'analyse': 'mots',           # lecture positionnelle via image_to_data
+}
+
+CACHE_DIR = Path(__file__).with_name('.ocr_cache')
+CACHE_MAX_MEMOIRE = 256
+CACHE_MAX_OCTETS_DISQUE = 20 * 1024 * 1024
+
+
+# --- CACHE DES RÉSULTATS ---
+class CacheOCR:
+    """Cache LRU des résultats OCR en mémoire et sur disque, indexé par empreinte de l'image et des réglages"""
+
+    def __init__(self, dossier, max_memoire=CACHE_MAX_MEMOIRE, max_octets_disque=CACHE_MAX_OCTETS_DISQUE):
+        self.dossier = Path(dossier)
+        self.max_memoire = max_memoire
+        self.max_octets_disque = max_octets_disque
+        self._memoire = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cle(image_bytes, reglages):
+        empreinte = hashlib.sha256(image_bytes)
+        empreinte.update(json.dumps(reglages, sort_keys=True).encode())
+        return empreinte.hexdigest()
+
+    def get(self, cle):
+        with self._lock:
+            if cle in self._memoire:
+                self._memoire.move_to_end(cle)
+                return dict(self._memoire[cle])
+
+        chemin = self.dossier / f"{cle}.json"
+        try:
+            resultat = json.loads(chemin.read_text())
+            os.utime(chemin)  # la date de modification sert d'ordre LRU sur disque
+        except (OSError, ValueError):
+            return None
+        resultat['Date'] = datetime.fromisoformat(resultat['Date'])
+        self._memoriser(cle, resultat)
+        return dict(resultat)
+
+    def put(self, cle, resultat):
+        self._memoriser(cle, resultat)
+        try:
+            self.dossier.mkdir(exist_ok=True)
+            contenu = dict(resultat, Date=resultat['Date'].isoformat())
+            (self.dossier / f"{cle}.json").write_text(json.dumps(contenu))
+            self._evincer_disque()
+        except OSError:
+            pass
+
+    def _memoriser(self, cle, resultat):
+        with self._lock:
+            self._memoire[cle] = dict(resultat)
+            self._memoire.move_to_end(cle)
+            while len(self._memoire) > self.max_memoire:
+                self._memoire.popitem(last=False)
+
+    def _evincer_disque(self):
+        fichiers = sorted(self.dossier.glob('*.json'), key=lambda f: f.stat().st_mtime)
+        total = sum(f.stat().st_size for f in fichiers)
+        for fichier in fichiers:
+            if total <= self.max_octets_disque:
+                break
+            total -= fichier.stat().st_size
+            fichier.unlink(missing_ok=True)
+
+
+cache_ocr = CacheOCR(CACHE_DIR)
+
+
+# --- PRÉTRAITEMENT ---
+def seuil_otsu(pixels):
+    """Seuil de binarisation d'Otsu d'une image en niveaux de gris (tableau uint8)"""
+    hist = np.bincount(pixels.ravel(), minlength=256).astype(float)
+    poids = np.cumsum(hist)
+    moyennes = np.cumsum(hist * np.arange(256))
+    total, moyenne_totale = poids[-1], moyennes[-1]
+    poids_fond = total - poids
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = (moyenne_totale * poids - moyennes * total) ** 2 / (poids * poids_fond)
+    # Image uniforme : variance indéfinie partout, le seuil 0 la laisse blanche
+    return int(np.argmax(np.nan_to_num(variance[:-1], nan=0.0)))
+
+
+def angle_inclinaison(image, amplitude=5, pas=0.5):
+    """Estime l'inclinaison du texte par profil de projection horizontal (en degrés)"""
+    apercu = image.copy()
+    apercu.thumbnail((400, 400))
+    meilleur, score_max = 0.0, -1.0
+    for angle in np.arange(-amplitude, amplitude + pas, pas):
+        tourne = np.asarray(apercu.rotate(angle, fillcolor=255)) < 128
+        score = tourne.sum(axis=1).astype(float).var()
+        if score > score_max:
+            meilleur, score_max = float(angle), score
+    return meilleur
+
+
+def pretraiter_image(image, reglages=REGLAGES_OCR):
+    """Prépare une photo de ticket pour l'OCR : orientation, gris, réduction, binarisation"""
+    image = ImageOps.exif_transpose(image).convert('L')
+
+    # Réduction à la résolution visée : un ticket de 80 mm à 300 dpi fait ~950 px de large
+    largeur_cible = round(reglages['largeur_ticket_mm'] / 25.4 * reglages['dpi'])
+    if image.width > largeur_cible:
+        hauteur = round(image.height * largeur_cible / image.width)
+        image = image.resize((largeur_cible, hauteur), Image.LANCZOS)
+
+    if reglages['binariser']:
+        pixels = np.asarray(image)
+        image = Image.fromarray(np.where(pixels > seuil_otsu(pixels), 255, 0).astype(np.uint8))
+
+    if reglages['redresser']:
+        angle = angle_inclinaison(image)
+        if angle:
+            image = image.rotate(angle, expand=True, fillcolor=255)
+    return image
+
+
+def config_tesseract(reglages=REGLAGES_OCR, whitelist=None):
+    """Options de ligne de commande Tesseract selon les réglages"""
+    options = []
+    if reglages['mode_rapide']:
+        options += ['--oem 1', f"--psm {reglages['psm']}"]
+    if whitelist:
+        options.append(f'-c tessedit_char_whitelist={whitelist}')
+    return ' '.join(options)
+
+
+# --- ANALYSE ---
+RE_MONTANT = re.compile(r"(\d+[,\.]\d{2})")
+RE_DATE = re.compile(r"(\d{2}[/\-\.]\d{2}[/\-\.](?:\d{4}|\d{2}))")  # JJ/MM/AAAA ou JJ/MM/AA
+RE_TOTAL = re.compile(r"\b(?:total|ttc|[àa]\s*payer|net\s*[àa]|montant\s*d[uû])\b", re.IGNORECASE)
+RE_PAS_TOTAL = re.compile(r"\b(?:sous[\s\-]*total|total\s*ht|tva|remise|rendu|article)", re.IGNORECASE)
+RE_LETTRES = re.compile(r"[A-Za-zÀ-ÿ]{3,}")
+
+SEUIL_CONFIANCE = 0.6      # en dessous, le champ est signalé à vérifier
+ZONE_EN_TETE = 0.25        # part haute du ticket où chercher l'enseigne
+
+
+def lire_montants_bas(image, reglages=REGLAGES_OCR):
+    """Relit le bas du ticket (zone du total) en ne reconnaissant que des chiffres"""
+    zone = image.crop((0, image.height * 2 // 3, image.width, image.height))
+    text = pytesseract.image_to_string(
+        zone, lang=reglages['lang'], config=config_tesseract(reglages, reglages['whitelist_montant'])
+    )
+    return RE_MONTANT.findall(text)
+
+
+def lignes_ocr(mots):
+    """Regroupe les mots de image_to_data en lignes (texte, confiance moyenne, position)"""
+    groupes = mots.groupby(['block_num', 'par_num', 'line_num'], sort=False)
+    lignes = groupes.agg(
+        top=('top', 'min'), bottom=('bottom', 'max'), conf=('conf', 'mean'),
+        texte=('text', ' '.join)
+    )
+    return lignes.sort_values('top').reset_index(drop=True)
+
+
+def trouver_total(mots, lignes):
+    """Montant en face du mot-clé TOTAL (même hauteur, à droite) : (montant, confiance) ou None"""
+    cles = lignes[lignes['texte'].str.contains(RE_TOTAL) & ~lignes['texte'].str.contains(RE_PAS_TOTAL)]
+    montants = mots[mots['text'].str.fullmatch(RE_MONTANT.pattern + r"\s*€?")]
+    candidats = []
+    for ligne in cles.itertuples():
+        centre = (ligne.top + ligne.bottom) / 2
+        # Tolérance verticale d'une demi-hauteur de ligne : le montant peut être dans un autre bloc
+        marge = (ligne.bottom - ligne.top) / 2 + 1
+        alignes = montants[((montants['top'] + montants['bottom']) / 2 - centre).abs() <= marge]
+        for mot in alignes.itertuples():
+            valeur = float(RE_MONTANT.search(mot.text).group(1).replace(',', '.'))
+            candidats.append((valeur, min(mot.conf, ligne.conf) / 100))
+    # Le total TTC est le plus grand des montants annoncés comme totaux
+    return max(candidats) if candidats else None
+
+
+def analyser_mots(mots):
+    """Extrait date, enseigne et total d'un ticket à partir des mots OCR positionnés
+
+    Chaque champ reçoit une confiance entre 0 et 1 ; les champs peu sûrs sont listés
+    dans 'A_verifier' pour être relus par l'utilisateur plutôt que re-scannés.
+    """
+    mots = mots[(mots['conf'] >= 0) & mots['text'].fillna('').str.strip().astype(bool)].copy()
+    mots['text'] = mots['text'].astype(str).str.strip()
+    mots['bottom'] = mots['top'] + mots['height']
+    confiance = {'Date': 0.0, 'Magasin': 0.0, 'Montant': 0.0}
+    if mots.empty:
+        return {'Date': datetime.now(), 'Magasin': "Ticket scanné", 'Montant': 0.0,
+                'Confiance': confiance, 'A_verifier': list(confiance)}
+    lignes = lignes_ocr(mots)
+
+    # Total : ligne du mot-clé, sinon plus grand montant du ticket (peu fiable)
+    total = trouver_total(mots, lignes)
+    if total is None:
+        autres = lignes['texte'][~lignes['texte'].str.contains(RE_PAS_TOTAL) & ~lignes['texte'].str.contains(RE_DATE)]
+        valeurs = [float(m.replace(',', '.')) for texte in autres for m in RE_MONTANT.findall(texte)]
+        total = (max(valeurs), SEUIL_CONFIANCE / 2) if valeurs else (0.0, 0.0)
+    montant, confiance['Montant'] = total
+
+    # Date : première date valide, confiance de sa ligne
+    date_found = datetime.now()
+    for ligne in lignes.itertuples():
+        trouve = RE_DATE.search(ligne.texte)
+        if trouve:
+            date = pd.to_datetime(trouve.group(1).replace('.', '/').replace('-', '/'), dayfirst=True, errors='coerce')
+            if pd.notna(date):
+                date_found, confiance['Date'] = date, ligne.conf / 100
+                break
+
+    # Enseigne : première ligne de texte de l'en-tête du ticket
+    store_name = "Ticket scanné"
+    limite = lignes['top'].min() + (lignes['bottom'].max() - lignes['top'].min()) * ZONE_EN_TETE
+    for ligne in lignes[lignes['top'] <= limite].itertuples():
+        if RE_LETTRES.search(ligne.texte) and not RE_DATE.search(ligne.texte):
+            store_name, confiance['Magasin'] = ligne.texte[:40], ligne.conf / 100
+            break
+
+    return {
+        'Date': date_found,
+        'Magasin': store_name,
+        'Montant': montant,
+        'Confiance': confiance,
+        'A_verifier': [champ for champ, c in confiance.items() if c < SEUIL_CONFIANCE]
+    }
+
+
+def extract_ticket_data(image, reglages=REGLAGES_OCR):
+    """Extraction des données d'un ticket en un seul passage OCR (lève une exception en cas d'échec)"""
+    mots = pytesseract.image_to_data(
+        image, lang=reglages['lang'], config=config_tesseract(reglages), output_type=pytesseract.Output.DATAFRAME
+    )
+    resultat = analyser_mots(mots)
+
+    # Aucun montant lu : seule la zone du total est relue, en chiffres uniquement
+    if resultat['Montant'] == 0:
+        prices = lire_montants_bas(image, reglages)
+        if prices:
+            resultat['Montant'] = float(prices[-1].replace(',', '.'))
+    return resultat
+
+
+def _analyser_sans_cache(image_bytes):
+    """Analyse un ticket à partir de ses octets ; les erreurs sont renvoyées dans le résultat"""
+    try:
+        image = pretraiter_image(Image.open(BytesIO(image_bytes)), REGLAGES_OCR)
+        return dict(extract_ticket_data(image, REGLAGES_OCR), Erreur=None)
+    except Exception as e:
+        return {'Date': datetime.now(), 'Magasin': "Ticket scanné", 'Montant': 0.0, 'Erreur': str(e),
+                'Confiance': {}, 'A_verifier': []}
+
+
+def analyser_ticket(image_bytes):
+    """Analyse un ticket, en réutilisant le résultat d'une analyse identique déjà faite"""
+    cle = cache_ocr.cle(image_bytes, REGLAGES_OCR)
+    resultat = cache_ocr.get(cle)
+    if resultat is None:
+        resultat = _analyser_sans_cache(image_bytes)
+        if resultat['Erreur'] is None:
+            cache_ocr.put(cle, resultat)
+    return resultat
+
+
+def analyser_tickets(images, max_workers=None):
+    """Analyse plusieurs tickets en parallèle (un thread par cœur)
+
+    Tesseract tourne déjà dans un sous-processus par ticket : des threads suffisent, sans
+    processus Python lancés par spawn (ils réexécuteraient le script Streamlit, importé comme __main__).
+    Produit (indice de l'image, résultat) au fur et à mesure que les analyses se terminent.
+    """
+    # Les tickets déjà analysés sont servis par le cache, seuls les autres vont au pool
+    cles = [cache_ocr.cle(data, REGLAGES_OCR) for data in images]
+    a_analyser = []
+    for i, cle in enumerate(cles):
+        resultat = cache_ocr.get(cle)
+        if resultat is None:
+            a_analyser.append(i)
+        else:
+            yield i, resultat
+
+    if not a_analyser:
+        return
+    max_workers = max_workers or min(len(a_analyser), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='whatnot-ocr-lot') as pool:
+        futures = {pool.submit(_analyser_sans_cache, images[i]): i for i in a_analyser}
+        for future in as_completed(futures):
+            i, resultat = futures[future], future.result()
+            if resultat['Erreur'] is None:
+                cache_ocr.put(cles[i], resultat)
+            yield i, resultat
+
+
+# --- TRAVAUX EN ARRIÈRE-PLAN ---
+class TravauxOCR:
+    """Exécute les analyses dans des threads de fond, suivies par identifiant de travail"""
+
+    def __init__(self, max_workers=2):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='whatnot-ocr')
+        self._travaux = {}
+        self._lock = threading.Lock()
+
+    def soumettre_ticket(self, image_bytes):
+        """Lance l'analyse d'un ticket et retourne l'identifiant du travail"""
+        return self._soumettre(lambda avancer: analyser_ticket(image_bytes), total=1)
+
+    def soumettre_lot(self, images):
+        """Lance l'analyse d'un lot de tickets ; le résultat est la liste dans l'ordre des images"""
+        def analyser_lot(avancer):
+            resultats = [None] * len(images)
+            for i, resultat in analyser_tickets(images):
+                resultats[i] = resultat
+                avancer()
+            return resultats
+        return self._soumettre(analyser_lot, total=len(images))
+
+    def _soumettre(self, fonction, total):
+        job_id = uuid.uuid4().hex[:12]
+        travail = {'faits': 0, 'total': total}
+
+        def avancer():
+            travail['faits'] += 1
+
+        with self._lock:
+            travail['future'] = self._pool.submit(fonction, avancer)
+            self._travaux[job_id] = travail
+        return job_id
+
+    def etat(self, job_id):
+        """(terminé, faits, total), ou None si le travail est inconnu (ex. après un redémarrage)"""
+        with self._lock:
+            travail = self._travaux.get(job_id)
+        if travail is None:
+            return None
+        return travail['future'].done(), travail['faits'], travail['total']
+
+    def resultat(self, job_id):
+        """Retire un travail terminé et retourne son résultat (relance son exception éventuelle)"""
+        with self._lock:
+            travail = self._travaux.pop(job_id)
+        return travail['future'].result()
@@ -0,0 +1,193 @@
+"""Rapport financier PDF (matplotlib), généré dans un thread de fond sans dépendance à Streamlit"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+
+import pandas as pd
+
+FORMAT_A4 = (8.27, 11.69)  # pouces, portrait
+LIGNES_PAR_PAGE = 35
+VERT, ROUGE, BLEU = '#10b981', '#ef4444', '#3b82f6'
+
+LIBELLES_METRIQUES = [
+    ('ca_brut', 'CA brut'),
+    ('total_depenses_live', 'Dépenses live'),
+    ('benefice_net', 'Bénéfice net'),
+    ('impots', 'Impôts (23 %)'),
+    ('part_julie', 'Part Julie (50 %)'),
+    ('part_matheo', 'Part Mathéo (50 %)'),
+    ('julie_recue', 'Déjà remboursé à Julie'),
+    ('julie_restant', 'Reste à rembourser à Julie'),
+    ('matheo_disponible', 'Disponible pour Mathéo'),
+]
+
+
+def euros(montant):
+    return f"{montant:.2f} €"
+
+
+# --- MISE EN PAGE ---
+def nouvelle_page(titre):
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=FORMAT_A4)
+    figure.suptitle(titre, fontsize=14, fontweight='bold', y=0.97)
+    return figure
+
+
+def pages_tableau(titre, tableau):
+    """Pages d'un tableau (DataFrame déjà formaté en texte), découpé par LIGNES_PAR_PAGE lignes"""
+    if tableau.empty:
+        figure = nouvelle_page(titre)
+        figure.text(0.5, 0.85, "Aucune donnée sur la période", ha='center', color='#6b7280')
+        return [figure]
+
+    pages = []
+    nb_pages = -(-len(tableau) // LIGNES_PAR_PAGE)
+    for i in range(nb_pages):
+        bloc = tableau.iloc[i * LIGNES_PAR_PAGE:(i + 1) * LIGNES_PAR_PAGE]
+        figure = nouvelle_page(titre if nb_pages == 1 else f"{titre} ({i + 1}/{nb_pages})")
+        axe = figure.add_axes([0.05, 0.05, 0.9, 0.87])
+        axe.axis('off')
+        table = axe.table(cellText=bloc.values, colLabels=list(bloc.columns), loc='upper center', cellLoc='left')
+        table.auto_set_font_size(False)
+        table.set_fontsize(8)
+        table.scale(1, 1.3)
+        pages.append(figure)
+    return pages
+
+
+# --- CONTENU ---
+def page_indicateurs(titre, data, metriques):
+    """Page de garde : indicateurs de la période"""
+    figure = nouvelle_page(titre)
+    figure.text(0.5, 0.92, f"Généré le {datetime.now().strftime('%d/%m/%Y %H:%M')} - {len(data)} opération(s)",
+                ha='center', color='#6b7280')
+    axe = figure.add_axes([0.15, 0.45, 0.7, 0.42])
+    axe.axis('off')
+    table = axe.table(
+        cellText=[[libelle, euros(metriques[cle])] for cle, libelle in LIBELLES_METRIQUES],
+        colLabels=['Indicateur', 'Montant'], loc='upper center', cellLoc='left'
+    )
+    table.auto_set_font_size(False)
+    table.set_fontsize(11)
+    table.scale(1, 1.8)
+    return figure
+
+
+def tableau_lives(data):
+    """Synthèse par live de la période (montants en centimes dans data)"""
+    lives = data[data['Live_ID'].notna()]
+    resume = lives.groupby('Live_ID', observed=True).agg(
+        date=('Date', 'max'),
+        gain=('Montant_Gain', 'sum'),
+        depense=('Montant_Depense', 'sum'),
+        nb=('Live_ID', 'size')
+    ).sort_values('date', ascending=False)
+    return pd.DataFrame({
+        'Live': resume.index.astype(str),
+        'Date': resume['date'].dt.strftime('%d/%m/%Y'),
+        'Gains': (resume['gain'] / 100).map(euros),
+        'Dépenses': (resume['depense'] / 100).map(euros),
+        'Bénéfice': ((resume['gain'] - resume['depense']) / 100).map(euros),
+        'Opérations': resume['nb'],
+    })
+
+
+def tableau_julie(data):
+    """Gains de la période pas encore entièrement remboursés à Julie"""
+    gains = data[(data['Montant_Gain'] > 0) & (data['Statut_Remb_Julie'] != 'Payé')].sort_values('Date')
+    part = gains['Montant_Gain'] / 2
+    return pd.DataFrame({
+        'Date': gains['Date'].dt.strftime('%d/%m/%Y'),
+        'Description': gains['Description'].astype(str).str.slice(0, 40),
+        'Part Julie': (part / 100).map(euros),
+        'Remboursé': (gains['Montant_Rembourse_Julie'] / 100).map(euros),
+        'Reste': ((part - gains['Montant_Rembourse_Julie']) / 100).map(euros),
+    })
+
+
+def page_graphiques(data):
+    """CA et dépenses par mois, top 10 des dépenses"""
+    figure = nouvelle_page("Graphiques")
+
+    mensuel = data.groupby('_Mois', observed=True)[['Montant_Gain', 'Montant_Depense']].sum() / 100
+    axe = figure.add_subplot(2, 1, 1)
+    if mensuel.empty:
+        axe.axis('off')
+    else:
+        positions = range(len(mensuel))
+        axe.bar([p - 0.2 for p in positions], mensuel['Montant_Gain'], width=0.4, color=VERT, label='Gains')
+        axe.bar([p + 0.2 for p in positions], mensuel['Montant_Depense'], width=0.4, color=ROUGE, label='Dépenses')
+        axe.set_xticks(list(positions), mensuel.index.astype(str), rotation=45, ha='right', fontsize=7)
+        axe.legend()
+    axe.set_title("Gains et dépenses par mois (€)")
+
+    depenses = data[data['Montant_Depense'] > 0]
+    top = (depenses.groupby('Description')['Montant_Depense'].sum() / 100).nlargest(10).sort_values()
+    axe = figure.add_subplot(2, 1, 2)
+    if top.empty:
+        axe.axis('off')
+    else:
+        axe.barh(top.index.astype(str).str.slice(0, 30), top.values, color=BLEU)
+        axe.tick_params(axis='y', labelsize=7)
+    axe.set_title("Top 10 des dépenses (€)")
+
+    figure.subplots_adjust(left=0.3, hspace=0.5, top=0.9)
+    return figure
+
+
+def generer_rapport_pdf(titre, data, metriques):
+    """PDF de la période : indicateurs, synthèse par live, remboursements Julie et graphiques"""
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    pages = [
+        page_indicateurs(titre, data, metriques),
+        *pages_tableau("Synthèse par live", tableau_lives(data)),
+        *pages_tableau("Remboursements Julie en attente", tableau_julie(data)),
+        page_graphiques(data),
+    ]
+    sortie = BytesIO()
+    with PdfPages(sortie) as pdf:
+        for page in pages:
+            pdf.savefig(page)
+    return sortie.getvalue()
+
+
+# --- TRAVAUX EN ARRIÈRE-PLAN ---
+class TravauxRapports:
+    """Rapports générés dans un thread de fond et conservés par clé (filtres, version des données)"""
+
+    def __init__(self, max_rapports=8, max_workers=1):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='whatnot-rapport')
+        self._rapports = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_rapports = max_rapports
+
+    def soumettre(self, cle, titre, data, metriques):
+        """Lance la génération si ce rapport n'existe pas déjà (ou a échoué)"""
+        with self._lock:
+            future = self._rapports.get(cle)
+            if future is not None and not (future.done() and future.exception()):
+                return
+            self._rapports[cle] = self._pool.submit(generer_rapport_pdf, titre, data, metriques)
+            # Les plus anciens rapports terminés sont oubliés au-delà de max_rapports
+            for ancienne in list(self._rapports)[:-self.max_rapports]:
+                if self._rapports[ancienne].done():
+                    del self._rapports[ancienne]
+
+    def etat(self, cle):
+        """True si terminé, False si en cours, None si jamais demandé"""
+        with self._lock:
+            future = self._rapports.get(cle)
+            if future is not None:
+                self._rapports.move_to_end(cle)
+        return None if future is None else future.done()
+
+    def resultat(self, cle):
+        """Octets du PDF d'un rapport terminé (relance son exception éventuelle)"""
+        with self._lock:
+            future = self._rapports[cle]
+        return future.result()
@@ -0,0 +1,42 @@
+"""Répartition des remboursements de Julie sur les gains, sans dépendance à Streamlit"""
+from datetime import datetime
+
+import numpy as np
+
+from doublons import en_centimes
+
+# Ordre de remboursement des gains : {libellé: colonnes de tri}
+ORDRES_FIFO = {
+    "📅 Plus anciens d'abord": ['Date'],
+    "🎬 Par live": ['Live_ID', 'Date']
+}
+
+
+def allouer_remboursement_fifo(gains, montant, ordre):
+    """Répartit montant sur les gains non remboursés dans l'ordre donné
+
+    gains au format mémoire (centimes), montant en euros ; retourne {ID_Operation: {colonne: valeur}}
+    pour les seuls gains touchés.
+    """
+    gains = gains.sort_values(ORDRES_FIFO[ordre], kind='stable')
+    part_cents = (gains['Montant_Gain'] / 2).round().astype('int64')
+    deja_cents = gains['Montant_Rembourse_Julie'].astype('int64')
+    reste_cents = (part_cents - deja_cents).clip(lower=0)
+
+    # Chaque gain reçoit ce qui reste du paiement après les gains qui le précèdent
+    disponible = en_centimes(montant) - (reste_cents.cumsum() - reste_cents)
+    alloue_cents = np.minimum(disponible.clip(lower=0), reste_cents)
+
+    touches = alloue_cents > 0
+    nouveau_total = (deja_cents + alloue_cents)[touches]
+    solde = (deja_cents + alloue_cents >= part_cents)[touches]
+    maintenant = datetime.now()
+
+    updates = {}
+    for op_id, total, paye in zip(gains.loc[touches, 'ID_Operation'], nouveau_total, solde):
+        changes = {'Montant_Rembourse_Julie': int(total)}
+        if paye:
+            changes['Statut_Remb_Julie'] = 'Payé'
+            changes['Date_Remb_Complete_Julie'] = maintenant
+        updates[op_id] = changes
+    return updates
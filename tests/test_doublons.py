@@ -0,0 +1,48 @@
+import pandas as pd
+
+from doublons import IndexDoublons
+
+
+def operations(descriptions, centimes, date='2026-10-01'):
+    return pd.DataFrame({
+        'Date': pd.to_datetime([date] * len(descriptions)),
+        'Description': descriptions,
+        'Montant_Gain': centimes,
+        'Montant_Depense': [0] * len(descriptions),
+        'ID_Operation': [f'op_{i}' for i in range(len(descriptions))],
+    })
+
+
+def test_recherche_exacte_sans_accents_ni_ponctuation():
+    index = IndexDoublons(operations(['Vente Pokémon !'], [1250]))
+
+    assert index.chercher('2026-10-01', 'vente pokemon', 12.5) == ['op_0']
+    assert index.chercher('2026-10-02', 'vente pokemon', 12.5) == []
+    assert index.chercher('2026-10-01', 'vente pokemon', 12.51) == []
+
+
+def test_recherche_floue():
+    index = IndexDoublons(operations(['Booster Evolutions'], [500]))
+
+    assert index.chercher('2026-10-01', 'Booster Evolution', 5, flou=True) == ['op_0']
+    assert index.chercher('2026-10-01', 'Booster Evolution', 5) == []
+    assert index.chercher('2026-10-01', 'Sleeves', 5, flou=True) == []
+
+
+def test_retrait():
+    data = operations(['Vente A', 'Vente B'], [1000, 2000])
+    index = IndexDoublons(data)
+
+    index.retirer(data.iloc[[0]])
+
+    assert len(index) == 1
+    assert index.chercher('2026-10-01', 'Vente A', 10) == []
+    assert index.chercher('2026-10-01', 'Vente A', 10, flou=True) == []
+
+
+def test_masque_des_doublons():
+    index = IndexDoublons(operations(['Vente A'], [1000]))
+
+    masque = index.doublons(operations(['Vente A', 'Vente B'], [1000, 1000]))
+
+    assert list(masque) == [True, False]
@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from import_whatnot import lire_export_whatnot, main, montants_en_centimes, vers_format_feuille
+from ledger import LocalLedger
+
+EXPORT = """Order ID,Order Date,Product Name,Sold Price,Show ID
+1001,2026-10-01,Carte A,"$1,234.50",show1
+1002,2026-10-01T21:15:00Z,Carte B,12.00,
+1003,10/02/2026 20:00,Carte C,"1,234",show1
+1004,,Carte D,5.00,show1
+1005,2026-10-03,Carte E,0,show1
+"""
+
+
+@pytest.fixture
+def fichier(tmp_path):
+    chemin = tmp_path / 'export.csv'
+    chemin.write_text(EXPORT, encoding='utf-8')
+    return chemin
+
+
+@pytest.mark.parametrize('texte, centimes', [
+    ('$1,234.50', 123450),
+    ('1 234,50 €', 123450),
+    ('1.234,5', 123450),
+    ('12.5', 1250),
+    ('12,50', 1250),
+    ('1,234', 123400),
+    ('1.234', 123400),
+    ('1,234,567', 123456700),
+    ('0,500', 50),
+])
+def test_montants(texte, centimes):
+    assert montants_en_centimes(pd.Series([texte])).iloc[0] == centimes
+
+
+def test_montant_illisible():
+    assert montants_en_centimes(pd.Series(['gratuit', ''])).isna().all()
+
+
+def test_lecture_de_l_export(fichier):
+    operations, nb_ignorees = lire_export_whatnot(fichier)
+
+    # Date absente ou montant nul : lignes ignorées
+    assert nb_ignorees == 2
+    assert list(operations['Date']) == [
+        pd.Timestamp('2026-10-01'), pd.Timestamp('2026-10-01 21:15'), pd.Timestamp('2026-10-02 20:00')
+    ]
+    assert list(operations['Montant_Gain']) == [123450, 1200, 123400]
+    # Live sans identifiant dans l'export : un live par jour de vente
+    assert list(operations['Live_ID']) == ['show1', 'LIVE_20261001', 'show1']
+    assert operations.at[0, 'Description'] == 'Whatnot #1001 - Carte A'
+
+
+def test_reimport_sans_doublons(fichier, tmp_path):
+    registre = tmp_path / 'registre.sqlite'
+    ledger = LocalLedger(registre)
+    operations, _ = lire_export_whatnot(fichier)
+    ledger.replace_from_remote(vers_format_feuille(operations).iloc[:0], ledger.version)
+
+    main([str(fichier), '--registre', str(registre)])
+    main([str(fichier), '--registre', str(registre)])
+
+    assert len(LocalLedger(registre).read_frame()) == 3
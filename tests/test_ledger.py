@@ -0,0 +1,152 @@
+import pandas as pd
+import pytest
+
+from ledger import LocalLedger, StructureFeuille, SyncWorker
+
+
+class FeuilleFactice:
+    """Feuille en mémoire ; echecs = {'append': n, ...} fait échouer les n prochains appels"""
+
+    def __init__(self, frame):
+        self.frame = frame.copy()
+        self.echecs = {}
+        self.attendues = []
+
+    def _appel(self, nom):
+        if self.echecs.get(nom):
+            self.echecs[nom] -= 1
+            raise ConnectionError(f"429 quota dépassé ({nom})")
+
+    def append(self, rows):
+        self._appel('append')
+        manquantes = set(rows.columns) - set(self.frame.columns)
+        if manquantes:
+            raise StructureFeuille(f"Colonnes absentes de la feuille : {sorted(manquantes)}")
+        self.frame = pd.concat([self.frame, rows], ignore_index=True)
+
+    def patch(self, updates, revisions, attendues):
+        self._appel('patch')
+        self.attendues.append(attendues)
+        for op_id, changes in updates.items():
+            for col, value in changes.items():
+                self.frame.loc[self.frame['ID_Operation'] == op_id, col] = value
+
+    def delete(self, ids):
+        self._appel('delete')
+        self.frame = self.frame[~self.frame['ID_Operation'].isin(ids)].reset_index(drop=True)
+
+    def rewrite(self, frame):
+        self._appel('rewrite')
+        self.frame = frame.copy()
+
+    def pull(self):
+        return self.frame.copy(), False
+
+
+def operations(*ids):
+    return pd.DataFrame({
+        'ID_Operation': list(ids),
+        'Montant_Gain': [10.0] * len(ids),
+        'Notes': [''] * len(ids),
+        'Revision': [0] * len(ids),
+    })
+
+
+@pytest.fixture
+def registre(tmp_path):
+    ledger = LocalLedger(tmp_path / 'registre.sqlite')
+    ledger.replace_from_remote(operations('a', 'b'), ledger.version)
+    return ledger
+
+
+@pytest.fixture
+def feuille():
+    return FeuilleFactice(operations('a', 'b'))
+
+
+def synchroniseur(ledger, feuille):
+    return SyncWorker(ledger, feuille.append, feuille.patch, feuille.delete, feuille.rewrite, feuille.pull)
+
+
+def test_ajout_non_renvoye_apres_echec_de_la_suite(registre, feuille):
+    registre.append(operations('c'))
+    registre.patch({'a': {'Notes': 'x'}})
+    feuille.echecs = {'patch': 1}
+    worker = synchroniseur(registre, feuille)
+
+    with pytest.raises(ConnectionError):
+        worker.sync_once()
+    worker.sync_once()
+
+    assert list(feuille.frame['ID_Operation']) == ['a', 'b', 'c']
+    assert feuille.frame.set_index('ID_Operation').at['a', 'Notes'] == 'x'
+    assert registre.pending_count() == 0
+
+
+def test_ajout_renvoye_si_son_envoi_a_echoue(registre, feuille):
+    registre.append(operations('c'))
+    feuille.echecs = {'append': 1}
+    worker = synchroniseur(registre, feuille)
+
+    with pytest.raises(ConnectionError):
+        worker.sync_once()
+    worker.sync_once()
+
+    assert list(feuille.frame['ID_Operation']) == ['a', 'b', 'c']
+    assert registre.pending_count() == 0
+
+
+def test_erreur_passagere_sans_reecriture(registre, feuille):
+    registre.patch({'a': {'Notes': 'x'}})
+    feuille.echecs = {'patch': 1}
+    worker = synchroniseur(registre, feuille)
+    reecritures = []
+    worker.push_rewrite = reecritures.append
+
+    with pytest.raises(ConnectionError):
+        worker.sync_once()
+    assert registre.pending_count() == 1
+
+    # Ligne ajoutée entre-temps par un autre appareil : conservée au nouvel essai
+    feuille.append(operations('d'))
+    worker.sync_once()
+
+    assert reecritures == []
+    assert list(feuille.frame['ID_Operation']) == ['a', 'b', 'd']
+    assert feuille.frame.set_index('ID_Operation').at['a', 'Notes'] == 'x'
+    assert registre.pending_count() == 0
+
+
+def test_nouvelle_colonne_programme_une_reecriture(registre, feuille):
+    registre.patch({'a': {'Date_Remb_Complete_Julie': '2026-10-01'}})
+    worker = synchroniseur(registre, feuille)
+
+    worker.sync_once()
+
+    assert 'Date_Remb_Complete_Julie' in feuille.frame.columns
+    assert registre.pending_count() == 0
+
+
+def test_feuille_sans_en_tete_reecrite(tmp_path):
+    registre = LocalLedger(tmp_path / 'registre.sqlite')
+    registre.replace_from_remote(operations(), registre.version)
+    feuille = FeuilleFactice(pd.DataFrame())
+    registre.append(operations('c'))
+    worker = synchroniseur(registre, feuille)
+
+    worker.sync_once()
+
+    assert list(feuille.frame['ID_Operation']) == ['c']
+    assert registre.pending_count() == 0
+
+
+def test_modification_envoyee_avec_les_valeurs_remplacees(registre, feuille):
+    registre.patch({'a': {'Notes': 'x'}})
+    registre.patch({'a': {'Notes': 'y', 'Montant_Gain': 12.0}})
+    worker = synchroniseur(registre, feuille)
+
+    worker.sync_once()
+
+    # Valeurs d'avant la première modification en attente : base de la fusion côté feuille
+    assert feuille.attendues == [{'a': {'Notes': '', 'Revision': 0, 'Montant_Gain': 10.0}}]
+    assert feuille.frame.set_index('ID_Operation').at['a', 'Notes'] == 'y'
@@ -0,0 +1,40 @@
+import pandas as pd
+
+from remboursements import allouer_remboursement_fifo
+
+PLUS_ANCIENS = "📅 Plus anciens d'abord"
+
+
+def gains():
+    # Parts de Julie : 10 €, 5 € (dont 2 € déjà remboursés), 20 €
+    return pd.DataFrame({
+        'ID_Operation': ['recent', 'ancien', 'moyen'],
+        'Date': pd.to_datetime(['2026-10-03', '2026-10-01', '2026-10-02']),
+        'Live_ID': ['LIVE_A', 'LIVE_B', 'LIVE_A'],
+        'Montant_Gain': [2000, 1000, 4000],
+        'Montant_Rembourse_Julie': [0, 200, 0],
+    })
+
+
+def test_plus_anciens_d_abord():
+    updates = allouer_remboursement_fifo(gains(), 10, PLUS_ANCIENS)
+
+    assert list(updates) == ['ancien', 'moyen']
+    assert updates['ancien']['Montant_Rembourse_Julie'] == 500
+    assert updates['ancien']['Statut_Remb_Julie'] == 'Payé'
+    assert updates['moyen'] == {'Montant_Rembourse_Julie': 700}
+
+
+def test_par_live():
+    updates = allouer_remboursement_fifo(gains(), 25, "🎬 Par live")
+
+    assert list(updates) == ['moyen', 'recent']
+    assert updates['moyen']['Statut_Remb_Julie'] == 'Payé'
+    assert updates['recent'] == {'Montant_Rembourse_Julie': 500}
+
+
+def test_paiement_total():
+    updates = allouer_remboursement_fifo(gains(), 33, PLUS_ANCIENS)
+
+    assert all(changes['Statut_Remb_Julie'] == 'Payé' for changes in updates.values())
+    assert 'Date_Remb_Complete_Julie' in updates['recent']